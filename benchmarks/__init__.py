@@ -0,0 +1,4 @@
+"""
+Throughput, oracle query and peak memory benchmarks of the cryptopals package. Run
+them with `python -m benchmarks`; see `python -m benchmarks --help`.
+"""
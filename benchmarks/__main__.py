@@ -0,0 +1,114 @@
+from __future__ import annotations
+import argparse
+import fnmatch
+import sys
+from pathlib import Path
+from typing import Optional, Union
+
+import benchmarks.cases  # noqa: F401 (registers the benchmarks)
+from benchmarks.harness import (
+    CASES,
+    MB,
+    load_baseline,
+    measure,
+    measure_reference,
+    parse_size,
+    regressions,
+    result_key,
+    save_baseline,
+    size_label,
+)
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark the cryptopals package, and compare against a baseline.",
+    )
+    parser.add_argument(
+        "patterns",
+        nargs="*",
+        default=["*"],
+        help="glob patterns of the benchmarks to run, e.g. 'aes.*' (default: all)",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=parse_size,
+        default=MB,
+        help="skip input sizes above this, e.g. 100MB (default: 1MB)",
+    )
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="record the results as the new baseline instead of comparing to it",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="fraction by which throughput and memory may be worse than the "
+        "baseline before it counts as a regression (default: 0.25)",
+    )
+    parser.add_argument("--list", action="store_true", help="list the benchmarks")
+    args = parser.parse_args(argv)
+
+    cases = [
+        c
+        for name, c in CASES.items()
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in args.patterns)
+    ]
+
+    if args.list:
+        for c in cases:
+            print(c.name, " ".join(size_label(sz) for sz in c.sizes))
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    results: dict[str, dict[str, Union[int, float, None]]] = {}
+    failures: list[str] = []
+
+    reference = measure_reference()
+    print(f"reference workload: {reference.mb_per_s:.3f} MB/s\n")
+
+    print(
+        f"{'benchmark':<44} {'MB/s':>10} {'relative':>10} {'queries':>8} "
+        f"{'peak mem':>12}"
+    )
+    for c in cases:
+        for sz in c.sizes:
+            if sz > args.max_size:
+                continue
+
+            m = measure(c.setup(sz), sz)
+            key = result_key(c.name, sz)
+            results[key] = m.to_json(reference)
+
+            queries = "" if m.queries is None else str(m.queries)
+            print(
+                f"{key:<44} {m.mb_per_s:>10.3f} {m.relative(reference):>10.4f} "
+                f"{queries:>8} {m.peak_mem:>12}"
+            )
+
+            if not args.update_baseline:
+                failures.extend(
+                    regressions(key, m, reference, baseline, args.tolerance)
+                )
+
+    if args.update_baseline:
+        # keep the baseline of anything that wasn't run this time
+        save_baseline(args.baseline, {**baseline, **results})
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+
+    if failures:
+        print("\nregressions:", *failures, sep="\n  ")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
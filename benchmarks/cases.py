@@ -0,0 +1,320 @@
+from __future__ import annotations
+import random
+from typing import Optional
+
+from benchmarks.harness import KB, MB, Run, Setup, case
+from cryptopals.aes import BLK_SZ_BYTES, AESContext, CBCDecryptStream, cbc_decrypt
+from cryptopals.aes import cbc_encrypt, ctr_encrypt, ecb_decrypt, ecb_encrypt
+from cryptopals.aes import cbc_encrypt_batch, ecb_encrypt_into, stream_chunks
+from cryptopals.bintext import b16dec, b16enc, b64dec, b64enc
+from cryptopals.hamming import hamming_distance
+from cryptopals.metering import MeteredEncryptor
+from cryptopals.oracle import crack_ecb_secret, profile_oracle
+from cryptopals.padding import pkcs7_pad, pkcs7_unpad, validate_pkcs7
+from cryptopals.padding_oracle import CBCPaddingOracle, crack_cbc_padding_oracle
+from cryptopals.score import ENGLISH_LETTER_FREQUENCY
+from cryptopals.xor import (
+    find_repeating_xor_key,
+    repeating_key_xor,
+    score_single_byte_xor_keys,
+)
+
+KEY = b"YELLOW SUBMARINE"
+IV = bytes(BLK_SZ_BYTES)
+XOR_KEY = b"Terminator X: Bring the noise"
+
+# inputs that take quadratic time, or many passes, get smaller sizes
+SMALL_SIZES = (KB, 64 * KB, MB)
+ORACLE_SIZES = (KB, 4 * KB)
+
+
+def random_bytes(sz: int) -> bytes:
+    # seeded, so that every run benchmarks the same input
+    return random.Random(sz).randbytes(sz)
+
+
+def english_text(sz: int) -> bytes:
+    # letters and spaces with english frequencies, which is all the scoring looks at
+    letters = list(ENGLISH_LETTER_FREQUENCY) + [" "]
+    weights = list(ENGLISH_LETTER_FREQUENCY.values()) + [0.18]
+    return "".join(random.Random(sz).choices(letters, weights, k=sz)).encode("ascii")
+
+
+def block_aligned(sz: int) -> bytes:
+    return random_bytes(sz - sz % BLK_SZ_BYTES)
+
+
+@case("bintext.b64enc")
+def _b64enc(sz: int) -> Run:
+    data = random_bytes(sz)
+
+    def run() -> None:
+        b64enc(data)
+
+    return run
+
+
+@case("bintext.b64dec")
+def _b64dec(sz: int) -> Run:
+    text = b64enc(random_bytes(sz))
+
+    def run() -> None:
+        b64dec(text)
+
+    return run
+
+
+@case("bintext.b16enc")
+def _b16enc(sz: int) -> Run:
+    data = random_bytes(sz)
+
+    def run() -> None:
+        b16enc(data)
+
+    return run
+
+
+@case("bintext.b16dec")
+def _b16dec(sz: int) -> Run:
+    text = b16enc(random_bytes(sz))
+
+    def run() -> None:
+        b16dec(text)
+
+    return run
+
+
+@case("hamming.hamming_distance")
+def _hamming_distance(sz: int) -> Run:
+    a = random_bytes(sz)
+    b = a[::-1]
+
+    def run() -> None:
+        hamming_distance(a, b)
+
+    return run
+
+
+@case("xor.repeating_key_xor")
+def _repeating_key_xor(sz: int) -> Run:
+    data = random_bytes(sz)
+
+    def run() -> None:
+        repeating_key_xor(data, XOR_KEY)
+
+    return run
+
+
+@case("xor.score_single_byte_xor_keys", SMALL_SIZES)
+def _score_single_byte_xor_keys(sz: int) -> Run:
+    ct = repeating_key_xor(english_text(sz), b"X")
+
+    def run() -> None:
+        for _ in score_single_byte_xor_keys(ct):
+            pass
+
+    return run
+
+
+@case("xor.find_repeating_xor_key", SMALL_SIZES)
+def _find_repeating_xor_key(sz: int) -> Run:
+    ct = repeating_key_xor(english_text(sz), XOR_KEY)
+
+    def run() -> None:
+        find_repeating_xor_key(ct)
+
+    return run
+
+
+@case("aes.ecb_encrypt")
+def _ecb_encrypt(sz: int) -> Run:
+    data = block_aligned(sz)
+
+    def run() -> None:
+        ecb_encrypt(data, KEY)
+
+    return run
+
+
+def _ecb_encrypt_into(workers: Optional[int]) -> Setup:
+    # the same input for every number of workers, so that the baseline shows how
+    # throughput scales with them
+    def setup(sz: int) -> Run:
+        data = block_aligned(sz)
+        out = bytearray(len(data))
+
+        def run() -> None:
+            ecb_encrypt_into(data, KEY, out, workers=workers)
+
+        return run
+
+    return setup
+
+
+for _workers in (1, 2, 4, None):
+    case(f"aes.ecb_encrypt_into_workers_{_workers or 'N'}")(_ecb_encrypt_into(_workers))
+
+
+@case("aes.ecb_decrypt")
+def _ecb_decrypt(sz: int) -> Run:
+    ct = block_aligned(sz)
+
+    def run() -> None:
+        ecb_decrypt(ct, KEY)
+
+    return run
+
+
+@case("aes.cbc_encrypt")
+def _cbc_encrypt(sz: int) -> Run:
+    data = block_aligned(sz)
+
+    def run() -> None:
+        cbc_encrypt(data, KEY, IV)
+
+    return run
+
+
+@case("aes.cbc_decrypt")
+def _cbc_decrypt(sz: int) -> Run:
+    ct = block_aligned(sz)
+
+    def run() -> None:
+        cbc_decrypt(ct, KEY, IV)
+
+    return run
+
+
+@case("aes.cbc_decrypt_stream")
+def _cbc_decrypt_stream(sz: int) -> Run:
+    ct = cbc_encrypt(pkcs7_pad(random_bytes(sz - 1), BLK_SZ_BYTES), KEY, IV)
+    chunks = [ct[i : i + 64 * KB] for i in range(0, len(ct), 64 * KB)]
+
+    def run() -> None:
+        for _ in stream_chunks(CBCDecryptStream(KEY, IV), chunks):
+            pass
+
+    return run
+
+
+@case("aes.cbc_encrypt_batch", SMALL_SIZES)
+def _cbc_encrypt_batch(sz: int) -> Run:
+    # many short messages, like the samples of a mode detection experiment
+    data = random_bytes(sz)
+    messages = [data[i : i + 60] for i in range(0, len(data), 64)]
+    ivs = [IV] * len(messages)
+
+    def run() -> None:
+        cbc_encrypt_batch(messages, KEY, ivs)
+
+    return run
+
+
+@case("aes.ctr_encrypt")
+def _ctr_encrypt(sz: int) -> Run:
+    data = random_bytes(sz)
+
+    def run() -> None:
+        ctr_encrypt(data, KEY, 0)
+
+    return run
+
+
+@case("padding.pkcs7_pad")
+def _pkcs7_pad(sz: int) -> Run:
+    data = random_bytes(sz - 1)
+
+    def run() -> None:
+        pkcs7_pad(data, BLK_SZ_BYTES)
+
+    return run
+
+
+@case("padding.pkcs7_unpad")
+def _pkcs7_unpad(sz: int) -> Run:
+    padded = pkcs7_pad(random_bytes(sz - 1), BLK_SZ_BYTES)
+
+    def run() -> None:
+        pkcs7_unpad(padded)
+
+    return run
+
+
+@case("padding.validate_pkcs7", (KB,))
+def _validate_pkcs7(sz: int) -> Run:
+    # a padding oracle validates one block at a time, many times over
+    blks = [pkcs7_pad(random_bytes(n), BLK_SZ_BYTES) for n in range(sz // BLK_SZ_BYTES)]
+
+    def run() -> None:
+        for blk in blks:
+            validate_pkcs7(blk[-BLK_SZ_BYTES:], BLK_SZ_BYTES)
+
+    return run
+
+
+class _SecretEncryptor:
+    """
+    Like oracle.ECBRandEncryptor, with a secret of any size.
+    """
+
+    def __init__(self, secret: bytes) -> None:
+        self._aes = AESContext(KEY)
+        self._secret = secret
+
+    def encrypt(self, plaintext: bytes) -> bytes:
+        return self._aes.encrypt_blocks(
+            pkcs7_pad(plaintext + self._secret, BLK_SZ_BYTES)
+        )
+
+
+def _queries(encryptor: MeteredEncryptor) -> Optional[int]:
+    queries = encryptor.stats().queries
+    encryptor.reset()
+    return queries
+
+
+@case("oracle.profile_oracle", ORACLE_SIZES)
+def _profile_oracle(sz: int) -> Run:
+    encryptor = MeteredEncryptor(_SecretEncryptor(english_text(sz)))
+
+    def run() -> Optional[int]:
+        profile_oracle(encryptor)
+        return _queries(encryptor)
+
+    return run
+
+
+@case("oracle.crack_ecb_secret", ORACLE_SIZES)
+def _crack_ecb_secret(sz: int) -> Run:
+    secret = english_text(sz)
+    encryptor = MeteredEncryptor(_SecretEncryptor(secret))
+
+    def run() -> Optional[int]:
+        assert crack_ecb_secret(encryptor) == secret
+        return _queries(encryptor)
+
+    return run
+
+
+class _CountingPaddingOracle(CBCPaddingOracle):
+    def __init__(self, key: bytes) -> None:
+        super().__init__(key)
+        self.queries = 0
+
+    def is_valid_padding(self, iv: bytes, ct: bytes) -> bool:
+        self.queries += 1
+        return super().is_valid_padding(iv, ct)
+
+
+@case("padding_oracle.crack_cbc_padding_oracle", (KB,))
+def _crack_cbc_padding_oracle(sz: int) -> Run:
+    oracle = _CountingPaddingOracle(KEY)
+    pt = english_text(sz)
+    iv, ct = oracle.encrypt(pt)
+
+    def run() -> Optional[int]:
+        oracle.queries = 0
+        assert crack_cbc_padding_oracle(oracle, iv, ct).plaintext == pt
+        return oracle.queries
+
+    return run
@@ -0,0 +1,199 @@
+from __future__ import annotations
+import hashlib
+import json
+import time
+import tracemalloc
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+KB = 1 << 10
+MB = 1 << 20
+
+SIZES = (KB, 64 * KB, MB, 16 * MB, 100 * MB)
+
+# a benchmark's setup gets an input size, does everything that shouldn't be timed, and
+# returns the function to time. that function returns the number of oracle queries it
+# made, if it made any.
+Run = Callable[[], Optional[int]]
+Setup = Callable[[int], Run]
+
+
+class Case:
+    def __init__(self, *, name: str, setup: Setup, sizes: tuple[int, ...]) -> None:
+        self.name = name
+        self.setup = setup
+        self.sizes = sizes
+
+
+CASES: dict[str, Case] = {}
+
+
+def case(name: str, sizes: tuple[int, ...] = SIZES) -> Callable[[Setup], Setup]:
+    def register(setup: Setup) -> Setup:
+        assert name not in CASES, f"duplicate benchmark {name}"
+        CASES[name] = Case(name=name, setup=setup, sizes=sizes)
+        return setup
+
+    return register
+
+
+def size_label(sz: int) -> str:
+    for unit, unit_sz in (("MB", MB), ("KB", KB)):
+        if sz >= unit_sz and sz % unit_sz == 0:
+            return f"{sz // unit_sz}{unit}"
+    return f"{sz}B"
+
+
+def parse_size(label: str) -> int:
+    label = label.strip().upper()
+    for unit, unit_sz in (("MB", MB), ("KB", KB), ("B", 1)):
+        if label.endswith(unit):
+            return int(label[: -len(unit)]) * unit_sz
+    return int(label)
+
+
+class Measurement:
+    """
+    The result of running one benchmark at one input size. seconds is the best time of
+    a run, and peak_mem is the most memory (in bytes) allocated at once during a run,
+    on top of what was allocated beforehand.
+    """
+
+    def __init__(
+        self, *, sz: int, seconds: float, queries: Optional[int], peak_mem: int
+    ) -> None:
+        self.sz = sz
+        self.seconds = seconds
+        self.queries = queries
+        self.peak_mem = peak_mem
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.sz / MB / self.seconds if self.seconds else float("inf")
+
+    def relative(self, reference: Measurement) -> float:
+        """
+        Throughput as a multiple of the throughput of the reference workload.
+        """
+        return self.mb_per_s / reference.mb_per_s
+
+    def to_json(self, reference: Measurement) -> dict[str, Union[int, float, None]]:
+        # absolute throughput only means something on the machine it was measured on,
+        # so baselines keep it relative to the reference
+        return {
+            "relative": float(f"{self.relative(reference):.4g}"),
+            "queries": self.queries,
+            "peak_mem": self.peak_mem,
+        }
+
+
+def measure(
+    run: Run, sz: int, *, min_time: float = 0.2, max_runs: int = 1000
+) -> Measurement:
+    # the first run warms up caches, and is the one oracle queries are counted in
+    queries = run()
+
+    # tracing allocations slows everything down, so it gets a run of its own
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_mem = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = float("inf")
+    total = 0.0
+    runs = 0
+    while runs < max_runs and (runs == 0 or total < min_time):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        runs += 1
+
+    return Measurement(sz=sz, seconds=best, queries=queries, peak_mem=peak_mem)
+
+
+REFERENCE_SZ = 64 * KB
+
+
+def _reference_setup(sz: int) -> Run:
+    data = bytes(range(256)) * (sz // 256)
+
+    def run() -> None:
+        # a python-level loop and a C pass over the data, the two things the benchmarks
+        # spend their time on
+        acc = 0
+        for b in data:
+            acc ^= b
+        hashlib.sha256(data * 16).digest()
+
+    return run
+
+
+def measure_reference(min_time: float = 0.5) -> Measurement:
+    """
+    Time a fixed workload, which every benchmark's throughput is compared relative to.
+    The ratio is far less machine-dependent than throughput itself, though a machine
+    that is fast at python and slow at C (or the other way around) still shifts it.
+    """
+    return measure(_reference_setup(REFERENCE_SZ), REFERENCE_SZ, min_time=min_time)
+
+
+def result_key(name: str, sz: int) -> str:
+    return f"{name}[{size_label(sz)}]"
+
+
+def load_baseline(path: Path) -> dict[str, dict[str, Union[int, float, None]]]:
+    if not path.exists():
+        return {}
+    with path.open("r") as f:
+        baseline: dict[str, dict[str, Union[int, float, None]]] = json.load(f)
+    return baseline
+
+
+def save_baseline(
+    path: Path, results: dict[str, dict[str, Union[int, float, None]]]
+) -> None:
+    with path.open("w") as f:
+        json.dump(dict(sorted(results.items())), f, indent=2)
+        f.write("\n")
+
+
+# peak memory of small runs is noisy in absolute terms, so growth below this is ignored
+_PEAK_MEM_SLACK = 64 * KB
+
+
+def regressions(
+    key: str,
+    m: Measurement,
+    reference: Measurement,
+    baseline: dict[str, dict[str, Union[int, float, None]]],
+    tolerance: float,
+) -> Iterable[str]:
+    """
+    Yield a description of every way m is worse than its baseline: slower relative to
+    the reference by more than tolerance (a fraction), more oracle queries, or more
+    memory by more than tolerance.
+    """
+    base = baseline.get(key)
+    if base is None:
+        return
+
+    base_relative = base.get("relative")
+    relative = m.relative(reference)
+    if base_relative is not None and relative < base_relative * (1 - tolerance):
+        yield f"{key}: {relative:.4f}x the reference, baseline {base_relative:.4f}x"
+
+    base_queries = base.get("queries")
+    if base_queries is not None and m.queries is not None and m.queries > base_queries:
+        yield f"{key}: {m.queries} oracle queries, baseline {base_queries}"
+
+    base_peak_mem = base.get("peak_mem")
+    if (
+        base_peak_mem is not None
+        and m.peak_mem > base_peak_mem * (1 + tolerance) + _PEAK_MEM_SLACK
+    ):
+        yield f"{key}: {m.peak_mem} bytes peak memory, baseline {base_peak_mem}"
@@ -1,57 +1,765 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+import mmap
+import os
+import sys
+import threading
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any, BinaryIO, Callable, Optional, Union
+
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptopals.xor import xor_bytes
+
+from cryptopals.padding import pkcs7_pad, pkcs7_unpad
+from cryptopals.xor import repeating_key_xor_into
+
+try:
+    import numpy as np
+
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+BytesLike = Union[bytes, bytearray, memoryview]
+WritableBuffer = Union[bytearray, memoryview]
 
 BLK_SZ_BYTES = 16
 
+# how many keys' contexts aes_context keeps around, in each thread
+_CONTEXT_CACHE_SZ = 64
 
-def ecb_encrypt(s: bytes, key: bytes) -> bytes:
-    """plz pad before"""
+# bytes read at a time by read_chunks
+_STREAM_CHUNK_SZ = 1 << 20
 
-    cipher = Cipher(algorithms.AES(key), modes.ECB())
-    encryptor = cipher.encryptor()  # type: ignore
+# the most and the fewest bytes per range that ecb_encrypt_into and ecb_decrypt_into
+# hand to a worker. inputs are split into a range per worker where these allow, so
+# that every worker has a share of even medium-sized inputs.
+_ECB_RANGE_SZ = 1 << 22
+_ECB_MIN_RANGE_SZ = 1 << 16
 
-    ct = encryptor.update(s) + encryptor.finalize()
+# bytes of CTR keystream generated at a time
+_CTR_CHUNK_SZ = 1 << 20
 
-    return ct  # type: ignore
 
+def _ecb_cipher(key: bytes) -> Cipher:
+    return Cipher(algorithms.AES(key), modes.ECB())
 
-def ecb_decrypt(s: bytes, key: bytes) -> bytes:
-    """plz pad after"""
-    cipher = Cipher(algorithms.AES(key), modes.ECB())
-    decryptor = cipher.decryptor()  # type: ignore
 
-    pt = decryptor.update(s) + decryptor.finalize()
+class AESContext:
+    """
+    AES in ECB mode under a single key, for encrypting and decrypting any number of
+    whole blocks.
 
-    return pt  # type: ignore
+    The key schedule and the cipher contexts are only set up once, when the object is
+    created, so hold on to one (or get it from aes_context) instead of rebuilding it for
+    every call. Whole blocks never leave data buffered in a context, so the contexts are
+    never finalized and can be reused forever. They aren't thread-safe though, so a
+    context must only be used by one thread at a time.
+    """
 
+    def __init__(self, key: BytesLike) -> None:
+        self.key = bytes(key)
+        self._cipher = _ecb_cipher(self.key)
+        self._encryptor = self._cipher.encryptor()  # type: ignore
+        # most users only ever encrypt, so the decryptor is only set up when needed
+        self._decryptor: Any = None
 
-def cbc_encrypt(s: bytes, key: bytes, iv: bytes) -> bytes:
+    def _get_decryptor(self) -> Any:
+        if self._decryptor is None:
+            self._decryptor = self._cipher.decryptor()  # type: ignore
+        return self._decryptor
+
+    def __reduce__(self) -> tuple[type[AESContext], tuple[bytes]]:
+        # cipher contexts can't be pickled, but they can be rebuilt from the key
+        return (AESContext, (self.key,))
+
+    def encrypt_blocks(self, s: BytesLike) -> bytes:
+        _check_blocks(s)
+        return self._encryptor.update(s)  # type: ignore
+
+    def decrypt_blocks(self, s: BytesLike) -> bytes:
+        _check_blocks(s)
+        return self._get_decryptor().update(s)  # type: ignore
+
+    def encrypt_blocks_into(self, s: BytesLike, out: WritableBuffer) -> int:
+        """
+        Encrypt s into the start of the writable buffer out and return the number of
+        bytes written.
+        """
+        return _update_into(self._encryptor, s, out)
+
+    def decrypt_blocks_into(self, s: BytesLike, out: WritableBuffer) -> int:
+        """
+        Decrypt s into the start of the writable buffer out and return the number of
+        bytes written.
+        """
+        return _update_into(self._get_decryptor(), s, out)
+
+
+def _check_blocks(s: BytesLike) -> None:
+    # a partial block would stay buffered in the context and garble every later call
+    if len(s) % BLK_SZ_BYTES != 0:
+        raise ValueError(
+            "The length of the provided data is not a multiple of the block length."
+        )
+
+
+def _update_into(ctx: Any, s: BytesLike, out: WritableBuffer) -> int:
+    _check_blocks(s)
+    if len(out) < len(s):
+        raise ValueError(f"Output buffer must hold at least {len(s)} bytes.")
+
+    # update_into wants room for an extra block that ecb never outputs, so when out is
+    # too tight, fall back to copying
+    if len(out) >= len(s) + BLK_SZ_BYTES - 1:
+        written: int = ctx.update_into(s, out)
+        return written
+
+    memoryview(out)[: len(s)] = ctx.update(s)
+    return len(s)
+
+
+_thread_contexts = threading.local()
+
+
+def _context_cache() -> Callable[[bytes], AESContext]:
+    # each thread builds its cache the first time it asks for a context
+    try:
+        cache: Callable[[bytes], AESContext] = _thread_contexts.cache
+    except AttributeError:
+        cache = lru_cache(maxsize=_CONTEXT_CACHE_SZ)(AESContext)
+        _thread_contexts.cache = cache
+    return cache
+
+
+def aes_context(key: BytesLike) -> AESContext:
+    """
+    Return an AESContext for key, from a bounded cache of the most recently used ones.
+    Contexts aren't thread-safe, so every thread has a cache of its own, and a context
+    from it must stay in the thread that got it.
+    """
+    return _context_cache()(bytes(key))
+
+
+def ecb_encrypt(s: bytes, key: bytes, *, workers: Optional[int] = 1) -> bytes:
     """plz pad before"""
-    assert len(iv) == BLK_SZ_BYTES
+    if workers == 1:
+        return aes_context(key).encrypt_blocks(s)
+    out = bytearray(len(s))
+    ecb_encrypt_into(s, key, out, workers=workers)
+    return bytes(out)
+
+
+def ecb_decrypt(s: bytes, key: bytes, *, workers: Optional[int] = 1) -> bytes:
+    """plz pad after"""
+    if workers == 1:
+        return aes_context(key).decrypt_blocks(s)
+    out = bytearray(len(s))
+    ecb_decrypt_into(s, key, out, workers=workers)
+    return bytes(out)
+
+
+def _ecb_range_into(
+    key: bytes, decrypt: bool, src: memoryview, dst: memoryview, start: int, end: int
+) -> None:
+    # contexts aren't thread-safe, so each worker thread uses one of its own for all
+    # of its ranges
+    aes = aes_context(key)
+    crypt_into = aes.decrypt_blocks_into if decrypt else aes.encrypt_blocks_into
+
+    # update_into wants an extra block of room after its output, which every range but
+    # the one at the very end of dst has. that one does its last block separately.
+    if end == len(dst) and end - start > BLK_SZ_BYTES:
+        crypt_into(src[start : end - BLK_SZ_BYTES], dst[start:])
+        start = end - BLK_SZ_BYTES
+    crypt_into(src[start:end], dst[start:])
+
+
+def _ecb_into(
+    s: BytesLike, key: bytes, out: WritableBuffer, decrypt: bool, workers: Optional[int]
+) -> int:
+    src = memoryview(s).cast("B")
+    dst = memoryview(out).cast("B")
+    _check_blocks(src)
+    if len(dst) < len(src):
+        raise ValueError(f"Output buffer must hold at least {len(src)} bytes.")
+
+    n = len(src)
+    workers = workers or os.cpu_count() or 1
+    range_sz = min(max(-(-n // workers), _ECB_MIN_RANGE_SZ), _ECB_RANGE_SZ)
+    range_sz += -range_sz % BLK_SZ_BYTES
+    ranges = [(start, min(start + range_sz, n)) for start in range(0, n, range_sz)]
 
-    ct = b""
-    last_ct_blk = iv
+    if workers == 1 or len(ranges) <= 1:
+        for start, end in ranges:
+            _ecb_range_into(key, decrypt, src, dst, start, end)
+        return n
 
-    for blk in (s[i : i + BLK_SZ_BYTES] for i in range(0, len(s), BLK_SZ_BYTES)):
-        xored = xor_bytes(last_ct_blk, blk)
-        new_ct_blk = ecb_encrypt(xored, key)
-        ct += new_ct_blk
-        last_ct_blk = new_ct_blk
+    # openssl runs without the gil, so threads run ranges on as many cores, each
+    # writing straight into its part of out
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_ecb_range_into, key, decrypt, src, dst, start, end)
+            for start, end in ranges
+        ]
+        for future in futures:
+            future.result()
 
-    return ct
+    return n
+
+
+def ecb_encrypt_into(
+    s: BytesLike, key: bytes, out: WritableBuffer, *, workers: Optional[int] = 1
+) -> int:
+    """
+    Encrypt s (a whole number of blocks) into the start of the writable buffer out, and
+    return the number of bytes written. Blocks don't depend on each other in ECB mode,
+    so with more than 1 worker (or None, for one per core), block-aligned ranges of s
+    are encrypted in parallel by a pool of threads.
+    """
+    return _ecb_into(s, key, out, False, workers)
+
+
+def ecb_decrypt_into(
+    s: BytesLike, key: bytes, out: WritableBuffer, *, workers: Optional[int] = 1
+) -> int:
+    """
+    Like ecb_encrypt_into, decrypting.
+    """
+    return _ecb_into(s, key, out, True, workers)
+
+
+def ecb_crypt_file(
+    src_path: Union[str, os.PathLike[str]],
+    dst_path: Union[str, os.PathLike[str]],
+    key: bytes,
+    *,
+    decrypt: bool = False,
+    workers: Optional[int] = None,
+) -> int:
+    """
+    Encrypt (or decrypt) the file at src_path into a file of the same size at dst_path,
+    through memory maps of both, and return its size. Padding is left to the caller.
+    dst_path must be a different file: opening it for writing would truncate src_path
+    before it is read.
+    """
+    if os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+        raise ValueError("Can't encrypt or decrypt a file into itself.")
+
+    with open(src_path, "rb") as src_f:
+        sz = os.fstat(src_f.fileno()).st_size
+        with open(dst_path, "w+b") as dst_f:
+            if not sz:
+                return 0
+            dst_f.truncate(sz)
+            with mmap.mmap(
+                src_f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as src_mm, mmap.mmap(dst_f.fileno(), sz) as dst_mm:
+                # views of the maps have to be gone before the maps can be closed
+                with memoryview(src_mm) as src, memoryview(dst_mm) as dst:
+                    return _ecb_into(src, key, dst, decrypt, workers)
+
+
+def _cbc_encrypt_blocks(aes: AESContext, s: BytesLike, prev_ct_blk: bytes) -> bytes:
+    # each block needs its own call, because it is xor-ed with the ciphertext of the
+    # block before it
+    encrypt_blocks = aes.encrypt_blocks
+    ct = bytearray(len(s))
+    view = memoryview(s)
+    last_ct_blk = int.from_bytes(prev_ct_blk, "big")
+
+    for i in range(0, len(s), BLK_SZ_BYTES):
+        xored = int.from_bytes(view[i : i + BLK_SZ_BYTES], "big") ^ last_ct_blk
+        new_ct_blk = encrypt_blocks(xored.to_bytes(BLK_SZ_BYTES, "big"))
+        ct[i : i + BLK_SZ_BYTES] = new_ct_blk
+        last_ct_blk = int.from_bytes(new_ct_blk, "big")
+
+    return bytes(ct)
+
+
+def _cbc_decrypt_blocks(aes: AESContext, s: BytesLike, prev_ct_blk: bytes) -> bytes:
+    # unlike encryption, every block can be decrypted at once: each plaintext block is
+    # the decrypted block xor-ed with the ciphertext block before it (or the iv), which
+    # is all known up front. so, decrypt everything in one call, then xor the whole
+    # buffer with the ciphertext shifted by one block.
+    if not s:
+        return b""
+
+    decrypted = aes.decrypt_blocks(s)
+    prev_ct_blks = prev_ct_blk + memoryview(s)[:-BLK_SZ_BYTES]
+
+    pt = int.from_bytes(decrypted, "big") ^ int.from_bytes(prev_ct_blks, "big")
+
+    return pt.to_bytes(len(s), "big")
+
+
+def cbc_encrypt(s: bytes, key: bytes, iv: bytes) -> bytes:
+    """plz pad before (or use CBCEncryptStream, which pads for you)"""
+    assert len(iv) == BLK_SZ_BYTES
+    assert len(s) % BLK_SZ_BYTES == 0
+
+    return _cbc_encrypt_blocks(aes_context(key), s, iv)
 
 
 def cbc_decrypt(s: bytes, key: bytes, iv: bytes) -> bytes:
-    """plz pad after"""
+    """plz pad after (or use CBCDecryptStream, which unpads for you)"""
     assert len(iv) == BLK_SZ_BYTES
+    assert len(s) % BLK_SZ_BYTES == 0
+
+    return _cbc_decrypt_blocks(aes_context(key), s, iv)
+
+
+def _ctr_counter_blks(nonce: int, first_blk: int, n_blks: int) -> bytes:
+    # each counter block is the nonce then the block counter, as little-endian 64-bit
+    # ints, so all of them are built at once as an array of (nonce, counter) pairs
+    assert 0 <= nonce < 1 << 64
+    assert 0 <= first_blk and first_blk + n_blks <= 1 << 64, "counter overflow"
+    ints = array("Q", [nonce]) * (2 * n_blks)
+    ints[1::2] = array("Q", range(first_blk, first_blk + n_blks))
+    if sys.byteorder == "big":
+        ints.byteswap()
+    return ints.tobytes()
+
+
+def ctr_keystream(key: bytes, nonce: int, offset: int, sz: int) -> bytes:
+    """
+    Return sz bytes of the CTR keystream of key and nonce, starting offset bytes in.
+    """
+    first_blk, skip = divmod(offset, BLK_SZ_BYTES)
+    n_blks = -(-(skip + sz) // BLK_SZ_BYTES)
+    # every counter block is encrypted in one call
+    keystream = aes_context(key).encrypt_blocks(
+        _ctr_counter_blks(nonce, first_blk, n_blks)
+    )
+    return keystream[skip : skip + sz]
+
+
+def ctr_encrypt_into(
+    s: BytesLike, key: bytes, nonce: int, out: WritableBuffer, offset: int = 0
+) -> int:
+    """
+    Encrypt (or decrypt, it's the same thing) s in CTR mode into the start of the
+    writable buffer out, and return the number of bytes written. offset is the position
+    of s in the whole stream, so that any part of a stream can be handled on its own.
+    """
+    src = memoryview(s).cast("B")
+    dst = memoryview(out).cast("B")
+    assert len(dst) >= len(src)
+
+    # a bounded amount of keystream at a time, however long s is
+    for start in range(0, len(src), _CTR_CHUNK_SZ):
+        chunk = src[start : start + _CTR_CHUNK_SZ]
+        keystream = ctr_keystream(key, nonce, offset + start, len(chunk))
+        repeating_key_xor_into(chunk, keystream, dst[start : start + len(chunk)])
+
+    return len(src)
+
+
+def _ctr_encrypt(s: bytes, key: bytes, nonce: int, offset: int) -> bytes:
+    out = bytearray(len(s))
+    ctr_encrypt_into(s, key, nonce, out, offset)
+    return bytes(out)
+
+
+def ctr_encrypt(
+    s: BytesLike,
+    key: bytes,
+    nonce: int,
+    *,
+    offset: int = 0,
+    workers: Optional[int] = 1,
+) -> bytes:
+    """
+    Encrypt s in CTR mode, where it starts offset bytes into the stream. No padding is
+    needed.
+
+    With more than 1 worker, s is split into block-aligned ranges, one per worker, whose
+    keystreams are independent of each other and are built by a pool of processes.
+    """
+    if workers == 1 or len(s) <= _CTR_CHUNK_SZ:
+        return _ctr_encrypt(bytes(s), key, nonce, offset)
+
+    n_workers = workers or os.cpu_count() or 1
+    # the keystream can start anywhere, but whole blocks per range avoid encrypting the
+    # counter block at each boundary twice
+    range_sz = -(-len(s) // n_workers)
+    range_sz += -range_sz % BLK_SZ_BYTES
+    view = memoryview(s)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(
+                _ctr_encrypt,
+                bytes(view[start : start + range_sz]),
+                key,
+                nonce,
+                offset + start,
+            )
+            for start in range(0, len(s), range_sz)
+        ]
+        return b"".join(future.result() for future in futures)
+
+
+def ctr_decrypt(
+    s: BytesLike,
+    key: bytes,
+    nonce: int,
+    *,
+    offset: int = 0,
+    workers: Optional[int] = 1,
+) -> bytes:
+    """the same as ctr_encrypt"""
+    return ctr_encrypt(s, key, nonce, offset=offset, workers=workers)
+
+
+class CTRStream:
+    """
+    CTR mode encryption (and decryption) of a stream of chunks of any size. There is
+    nothing to buffer or pad, and seek moves to any position of the stream, so a range
+    of a huge file can be decrypted without touching anything before it.
+    """
+
+    def __init__(self, key: bytes, nonce: int, offset: int = 0) -> None:
+        self.key = key
+        self.nonce = nonce
+        self._offset = offset
+
+    def seek(self, offset: int) -> None:
+        assert offset >= 0
+        self._offset = offset
+
+    def tell(self) -> int:
+        return self._offset
+
+    def update_into(self, chunk: BytesLike, out: WritableBuffer) -> int:
+        n = ctr_encrypt_into(chunk, self.key, self.nonce, out, self._offset)
+        self._offset += n
+        return n
+
+    def update(self, chunk: BytesLike) -> bytes:
+        out = bytearray(len(chunk))
+        self.update_into(chunk, out)
+        return bytes(out)
+
+
+class CiphertextBatch:
+    """
+    Many ciphertexts packed back to back in one buffer. Ciphertext i is
+    buffer[offsets[i] : offsets[i + 1]], so offsets has one more entry than there are
+    ciphertexts. Indexing returns a memoryview of the buffer, not a copy.
+    """
+
+    def __init__(self, *, buffer: bytearray, offsets: array[int]) -> None:
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> memoryview:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("ciphertext index out of range")
+        return memoryview(self.buffer)[self.offsets[idx] : self.offsets[idx + 1]]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        view = memoryview(self.buffer)
+        offsets = self.offsets
+        for i in range(len(self)):
+            yield view[offsets[i] : offsets[i + 1]]
+
+
+# _PADS[n] is a pkcs7 pad of n bytes
+_PADS = [bytes([n]) * n for n in range(BLK_SZ_BYTES + 1)]
+
+
+def _pack(messages: Sequence[BytesLike], pad: bool) -> tuple[bytearray, array[int]]:
+    """
+    Copy messages back to back into one buffer, each padded unless pad is False, and
+    return it along with the offsets of the messages in it. The buffer has a spare
+    block at the end, which update_into wants room for.
+    """
+    offsets: array[int] = array("Q", [0])
+    total = 0
+    for msg in messages:
+        total += len(msg) + (BLK_SZ_BYTES - len(msg) % BLK_SZ_BYTES if pad else 0)
+        offsets.append(total)
+
+    buffer = bytearray(total + BLK_SZ_BYTES)
+    for i, msg in enumerate(messages):
+        start, end = offsets[i], offsets[i + 1]
+        buffer[start : start + len(msg)] = msg
+        if pad:
+            buffer[start + len(msg) : end] = _PADS[end - start - len(msg)]
+        else:
+            _check_blocks(msg)
+
+    return buffer, offsets
+
+
+def _finish_batch(buffer: bytearray, offsets: array[int]) -> CiphertextBatch:
+    # shrinking a bytearray from the end doesn't copy it
+    del buffer[offsets[-1] :]
+    return CiphertextBatch(buffer=buffer, offsets=offsets)
+
+
+def ecb_encrypt_batch(
+    messages: Sequence[BytesLike], key: bytes, *, pad: bool = True
+) -> CiphertextBatch:
+    """
+    Encrypt every message under key in ECB mode (pkcs7-padding each, unless pad is
+    False). The blocks of all messages are encrypted in place by a single call.
+    """
+    buffer, offsets = _pack(messages, pad)
+    with memoryview(buffer) as view:
+        aes_context(key).encrypt_blocks_into(view[: offsets[-1]], view)
+    return _finish_batch(buffer, offsets)
+
+
+def cbc_encrypt_batch(
+    messages: Sequence[BytesLike],
+    key: bytes,
+    ivs: Sequence[bytes],
+    *,
+    pad: bool = True,
+) -> CiphertextBatch:
+    """
+    Encrypt every message under key in CBC mode, each with its own iv (pkcs7-padding
+    each, unless pad is False).
+
+    Blocks of a message have to be encrypted one after the other, but blocks of
+    different messages don't. So with numpy, block j of every message is encrypted by
+    one call, and there are only as many calls as the longest message has blocks.
+    """
+    assert len(ivs) == len(messages)
+    assert all(len(iv) == BLK_SZ_BYTES for iv in ivs)
+    buffer, offsets = _pack(messages, pad)
+    aes = aes_context(key)
+
+    if HAVE_NUMPY:
+        _cbc_encrypt_packed_np(aes, buffer, offsets, ivs)
+    else:
+        with memoryview(buffer) as view:
+            for i, iv in enumerate(ivs):
+                start, end = offsets[i], offsets[i + 1]
+                view[start:end] = _cbc_encrypt_blocks(aes, view[start:end], iv)
+
+    return _finish_batch(buffer, offsets)
+
+
+def _cbc_encrypt_packed_np(
+    aes: AESContext, buffer: bytearray, offsets: array[int], ivs: Sequence[bytes]
+) -> None:
+    blks = np.frombuffer(buffer, dtype=np.uint8).reshape(-1, BLK_SZ_BYTES)
+    first_rows = np.frombuffer(offsets, dtype=np.uint64)[:-1].astype(np.intp)
+    first_rows //= BLK_SZ_BYTES
+    n_blks = np.diff(np.frombuffer(offsets, dtype=np.uint64)).astype(np.intp)
+    n_blks //= BLK_SZ_BYTES
+
+    # longest messages first, so that the messages with a block j are a prefix
+    order = np.argsort(-n_blks, kind="stable")
+    first_rows = first_rows[order]
+    # n_active[j] is the number of messages with more than j blocks
+    n_active = np.searchsorted(
+        -n_blks[order], -np.arange(n_blks.max(initial=0)), "left"
+    )
+    prev = np.frombuffer(b"".join(ivs), dtype=np.uint8).reshape(-1, BLK_SZ_BYTES)
+    prev = prev[order]
+
+    for j, n in enumerate(n_active.tolist()):
+        rows = first_rows[:n] + j
+        xored = blks[rows] ^ prev[:n]
+        ct = np.frombuffer(aes.encrypt_blocks(xored.tobytes()), dtype=np.uint8)
+        prev = ct.reshape(-1, BLK_SZ_BYTES)
+        blks[rows] = prev
+
+
+def encrypt_batch(
+    jobs: Iterable[Union[tuple[bytes, BytesLike], tuple[bytes, BytesLike, bytes]]],
+    *,
+    pad: bool = True,
+) -> CiphertextBatch:
+    """
+    Encrypt each (key, plaintext) job in ECB mode, and each (key, plaintext, iv) job in
+    CBC mode, pkcs7-padding each plaintext unless pad is False.
+    """
+    jobs = list(jobs)
+    buffer, offsets = _pack([job[1] for job in jobs], pad)
+
+    with memoryview(buffer) as view:
+        for i, job in enumerate(jobs):
+            start, end = offsets[i], offsets[i + 1]
+            # keys are usually all different, so contexts aren't worth caching
+            aes = AESContext(job[0])
+            if len(job) == 2:
+                aes.encrypt_blocks_into(view[start:end], view[start:])
+            else:
+                view[start:end] = _cbc_encrypt_blocks(aes, view[start:end], job[2])
+
+    return _finish_batch(buffer, offsets)
+
+
+class _BlockStream(ABC):
+    """
+    Runs a stream of chunks of any size through a block cipher mode, a whole number of
+    blocks at a time. Bytes of a partial block are held until the next chunk completes
+    it, and so is the last whole block when decrypting with padding, since only
+    finalize can tell that it is the last one.
+
+    Memory use is bounded by the chunk size, not by the length of the stream.
+    """
+
+    def __init__(self, *, hold_last_blk: bool) -> None:
+        self._hold_last_blk = hold_last_blk
+        self._pending = bytearray()
+        self._finalized = False
+
+    @abstractmethod
+    def _process(self, blks: BytesLike) -> bytes: ...
+
+    @abstractmethod
+    def _finish(self, pending: bytes) -> bytes: ...
+
+    def update(self, chunk: BytesLike) -> bytes:
+        assert not self._finalized, "update after finalize"
+        view = memoryview(chunk).cast("B")
+        out = []
+
+        if self._pending:
+            # top up the pending bytes to a whole block first
+            take = min(len(view), -len(self._pending) % BLK_SZ_BYTES)
+            self._pending += view[:take]
+            view = view[take:]
+
+            if len(self._pending) == BLK_SZ_BYTES and (view or not self._hold_last_blk):
+                out.append(self._process(bytes(self._pending)))
+                self._pending.clear()
+
+        # then the chunk's own whole blocks, straight out of it
+        n = len(view) - len(view) % BLK_SZ_BYTES
+        if self._hold_last_blk and n and n == len(view):
+            n -= BLK_SZ_BYTES
+        if n:
+            out.append(self._process(view[:n]))
+        self._pending += view[n:]
+
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        assert not self._finalized, "finalize called twice"
+        self._finalized = True
+        pending = bytes(self._pending)
+        self._pending.clear()
+        return self._finish(pending)
+
+
+class _EncryptStream(_BlockStream):
+    def __init__(self, *, pad: bool) -> None:
+        super().__init__(hold_last_blk=False)
+        self._pad = pad
+
+    def _finish(self, pending: bytes) -> bytes:
+        if self._pad:
+            return self._process(pkcs7_pad(pending, BLK_SZ_BYTES))
+        _check_blocks(pending)
+        return b""
+
+
+class _DecryptStream(_BlockStream):
+    def __init__(self, *, unpad: bool) -> None:
+        super().__init__(hold_last_blk=unpad)
+        self._unpad = unpad
+
+    def _finish(self, pending: bytes) -> bytes:
+        _check_blocks(pending)
+        if not self._unpad:
+            return b""
+        if not pending:
+            raise ValueError("There is no padded block to decrypt.")
+        return pkcs7_unpad(self._process(pending), BLK_SZ_BYTES)
+
+
+class ECBEncryptStream(_EncryptStream):
+    """
+    Encrypts a stream of chunks with AES in ECB mode. update returns the ciphertext of
+    the whole blocks so far, and finalize the rest, pkcs7-padded unless pad is False
+    (in which case the stream must have been a whole number of blocks).
+    """
+
+    def __init__(self, key: bytes, *, pad: bool = True) -> None:
+        super().__init__(pad=pad)
+        # a stream may be handed to another thread, so it doesn't share a context
+        self._aes = AESContext(key)
+
+    def _process(self, blks: BytesLike) -> bytes:
+        return self._aes.encrypt_blocks(blks)
+
+
+class ECBDecryptStream(_DecryptStream):
+    """
+    Decrypts a stream of chunks with AES in ECB mode. Unless unpad is False, finalize
+    checks and strips the pkcs7 padding of the last block.
+    """
+
+    def __init__(self, key: bytes, *, unpad: bool = True) -> None:
+        super().__init__(unpad=unpad)
+        self._aes = AESContext(key)
+
+    def _process(self, blks: BytesLike) -> bytes:
+        return self._aes.decrypt_blocks(blks)
+
+
+class CBCEncryptStream(_EncryptStream):
+    """
+    Like ECBEncryptStream in CBC mode, chaining blocks across chunks.
+    """
+
+    def __init__(self, key: bytes, iv: bytes, *, pad: bool = True) -> None:
+        assert len(iv) == BLK_SZ_BYTES
+        super().__init__(pad=pad)
+        self._aes = AESContext(key)
+        self._prev_ct_blk = iv
+
+    def _process(self, blks: BytesLike) -> bytes:
+        ct = _cbc_encrypt_blocks(self._aes, blks, self._prev_ct_blk)
+        self._prev_ct_blk = ct[-BLK_SZ_BYTES:]
+        return ct
+
+
+class CBCDecryptStream(_DecryptStream):
+    """
+    Like ECBDecryptStream in CBC mode, chaining blocks across chunks.
+    """
+
+    def __init__(self, key: bytes, iv: bytes, *, unpad: bool = True) -> None:
+        assert len(iv) == BLK_SZ_BYTES
+        super().__init__(unpad=unpad)
+        self._aes = AESContext(key)
+        self._prev_ct_blk = iv
+
+    def _process(self, blks: BytesLike) -> bytes:
+        pt = _cbc_decrypt_blocks(self._aes, blks, self._prev_ct_blk)
+        self._prev_ct_blk = bytes(blks[-BLK_SZ_BYTES:])
+        return pt
+
 
-    pt = b""
-    last_ct_blk = iv
+def read_chunks(f: BinaryIO, chunk_sz: int = _STREAM_CHUNK_SZ) -> Iterator[bytes]:
+    """
+    Read the binary file object f in chunks of up to chunk_sz bytes.
+    """
+    while chunk := f.read(chunk_sz):
+        yield chunk
 
-    for blk in (s[i : i + BLK_SZ_BYTES] for i in range(0, len(s), BLK_SZ_BYTES)):
-        new_pt_blk = ecb_decrypt(blk, key)
-        xored = xor_bytes(last_ct_blk, new_pt_blk)
-        pt += xored
-        last_ct_blk = blk
 
-    return pt
+def stream_chunks(stream: _BlockStream, chunks: Iterable[BytesLike]) -> Iterator[bytes]:
+    """
+    Run chunks (e.g. from read_chunks) through stream, finalize it, and yield whatever
+    comes out along the way.
+    """
+    for chunk in chunks:
+        if out := stream.update(chunk):
+            yield out
+    if out := stream.finalize():
+        yield out
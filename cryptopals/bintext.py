@@ -1,166 +1,401 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, Iterator, NoReturn, Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+TextLike = Union[str, BytesLike]
+
 _ALPHABETS = {
     16: "0123456789ABCDEF",
     64: R"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/",
 }
 
-_ENCODE = {
-    base: {value: encoding for value, encoding in enumerate(alphabet)}
-    for base, alphabet in _ALPHABETS.items()
-}
+PAD_CHAR = "="
 
-_B64_ENCODE = _ENCODE[64]
-_B16_ENCODE = _ENCODE[16]
+_B64_ALPHABET = _ALPHABETS[64].encode("ascii")
+_B16_ALPHABET = _ALPHABETS[16].encode("ascii")
+_B16_ALPHABET_ANY_CASE = _B16_ALPHABET + _B16_ALPHABET.lower()
+_B64_PADDINGS = (PAD_CHAR.encode("ascii"), PAD_CHAR.encode("ascii") * 2)
 
-_B64_DECODE = {encoding: value for value, encoding in _B64_ENCODE.items()}
-_B16_DECODE = {encoding: value for value, encoding in _B16_ENCODE.items()}
+# the codecs below never look at a single character from python. instead, each step
+# maps every byte of a buffer through a 256-entry table with bytes.translate, and
+# shifted pieces that overlap in an output byte are combined by or-ing whole buffers
+# as big integers. the only python-level iteration is over chunks.
+_CHUNK_SZ = 1 << 16
+
+
+def _table(f: Callable[[int], int]) -> bytes:
+    return bytes(f(i) & 0xFF for i in range(256))
+
+
+# byte value -> alphabet code. only the low 6 (or 4) bits of the value are used.
+_B64_ENCODE = _table(lambda i: _B64_ALPHABET[i & 0x3F])
+_B16_ENCODE_HI = _table(lambda i: _B16_ALPHABET[i >> 4])
+_B16_ENCODE_LO = _table(lambda i: _B16_ALPHABET[i & 0xF])
+
+# alphabet code -> value. the pad character decodes to 0, which is only ever used in a
+# final quantum that has already been validated.
+_B64_DECODE = _table(lambda i: _B64_ALPHABET.find(i) if i in _B64_ALPHABET else 0)
+_B16_DECODE = _table(
+    lambda i: (
+        _B16_ALPHABET.find(bytes([i]).upper()) if i in _B16_ALPHABET_ANY_CASE else 0
+    )
+)
+
+# shift tables used to split and recombine bit fields
+_SHL2 = _table(lambda i: i << 2)
+_SHL4 = _table(lambda i: i << 4)
+_SHL6 = _table(lambda i: i << 6)
+_SHR2 = _table(lambda i: i >> 2)
+_SHR4 = _table(lambda i: i >> 4)
+_SHR6 = _table(lambda i: i >> 6)
+_LO2_SHL4 = _table(lambda i: (i & 0x3) << 4)
+_LO4_SHL2 = _table(lambda i: (i & 0xF) << 2)
+
+
+def _or_bytes(a: bytes, b: bytes) -> bytes:
+    # a and b never have bits set in the same positions, so this is also their sum
+    return (int.from_bytes(a, "big") | int.from_bytes(b, "big")).to_bytes(len(a), "big")
 
-PAD_CHAR = "="
 
+def _as_bytes(s: BytesLike) -> bytes:
+    return s if isinstance(s, bytes) else bytes(s)
 
-def b64dec(s: str) -> bytes:
+
+def _b64_raise(s: str) -> NoReturn:
+    # replays the character-at-a-time validation on an input already known to be bad,
+    # so that the same error is raised for the same (first) offending character.
     codes_in_quantum = 4
-    out = []
-    buf = 0
     padding_seen = 0
 
-    if len(s) % codes_in_quantum != 0:
-        raise ValueError("Input string must have length divisible by 4.")
-
     quanta = (s[i : i + codes_in_quantum] for i in range(0, len(s), codes_in_quantum))
     for quantum in quanta:
         for code in quantum:
-            buf <<= 6
-            if code in _B64_DECODE:
+            if code in _ALPHABETS[64]:
                 if padding_seen > 0:
                     raise ValueError(
                         "Found padding character in middle of input string"
                     )
-                buf += _B64_DECODE[code]
             elif code == PAD_CHAR:
                 padding_seen += 1
             else:
                 raise ValueError("Illegal character in input string")
 
-        # padding == 0, 1, or 2: add octet 0 (always)
-        byte_0 = (buf & 0xFF0000) >> 16
-        out.append(byte_0)
+        if padding_seen >= 3:
+            raise ValueError("Illegal number of padding characters in input string")
 
-        # padding == 0 or 1: add octet 1
-        if padding_seen < 2:
-            byte_1 = (buf & 0xFF00) >> 8
-            out.append(byte_1)
+    raise AssertionError("input string is valid")  # pragma: no cover
 
-        # padding == 0: add octet 2
-        if padding_seen == 0:
-            byte_2 = buf & 0xFF
-            out.append(byte_2)
 
-        if padding_seen >= 3:
-            raise ValueError("Illegal number of padding characters in input string")
+def _b64_validate(s: TextLike) -> bytes:
+    """
+    Return s as ascii bytes if it is valid base64, otherwise raise a ValueError.
+    """
+    if len(s) % 4 != 0:
+        raise ValueError("Input string must have length divisible by 4.")
 
-        buf = 0
+    if isinstance(s, str):
+        try:
+            data = s.encode("ascii")
+        except UnicodeEncodeError:
+            _b64_raise(s)
+    else:
+        data = _as_bytes(s)
 
-    return bytes(out)
+    # valid input is all alphabet codes followed by zero, one or two pad characters
+    leftover = data.translate(None, _B64_ALPHABET)
+    if leftover and not (leftover in _B64_PADDINGS and data.endswith(leftover)):
+        _b64_raise(data.decode("latin-1"))
+
+    return data
+
+
+def _b64dec_quanta(data: bytes) -> bytearray:
+    # data is a validated run of whole quanta. sextets a, b, c, d become bytes:
+    #   aaaaaabb bbbbcccc ccdddddd
+    sextets = data.translate(_B64_DECODE)
+    a, b, c, d = (sextets[i::4] for i in range(4))
 
+    out = bytearray(len(sextets) // 4 * 3)
+    out[0::3] = _or_bytes(a.translate(_SHL2), b.translate(_SHR4))
+    out[1::3] = _or_bytes(b.translate(_SHL4), c.translate(_SHR2))
+    out[2::3] = _or_bytes(c.translate(_SHL6), d)
 
-def b16dec(s: str) -> bytes:
-    codes_in_quantum = 2
-    out = []
-    byte = 0
+    return out
 
-    s = s.upper()
 
-    if len(s) % codes_in_quantum != 0:
+def _b64dec_len(data: bytes) -> int:
+    padding = len(data) - len(data.rstrip(PAD_CHAR.encode("ascii")))
+    return len(data) // 4 * 3 - padding
+
+
+def b64dec_into(s: TextLike, out: Union[bytearray, memoryview]) -> int:
+    """
+    Decode base64 s into the start of the writable buffer out and return the number of
+    bytes written. s may be a str or any bytes-like object.
+    """
+    data = _b64_validate(s)
+    out_len = _b64dec_len(data)
+
+    if len(out) < out_len:
+        raise ValueError(f"Output buffer must hold at least {out_len} bytes.")
+
+    return _b64dec_validated_into(data, out_len, memoryview(out))
+
+
+def _b64dec_validated_into(data: bytes, out_len: int, view: memoryview) -> int:
+    written = 0
+
+    for start in range(0, len(data), _CHUNK_SZ):
+        decoded = _b64dec_quanta(data[start : start + _CHUNK_SZ])
+        # the final chunk may decode pad characters into bytes that are not output
+        decoded = decoded[: out_len - written]
+        view[written : written + len(decoded)] = decoded
+        written += len(decoded)
+
+    return written
+
+
+def b64dec(s: TextLike) -> bytes:
+    data = _b64_validate(s)
+    out = bytearray(_b64dec_len(data))
+    _b64dec_validated_into(data, len(out), memoryview(out))
+    return bytes(out)
+
+
+def _b16_raise(s: str) -> NoReturn:
+    for code in s.upper():
+        if code not in _ALPHABETS[16]:
+            raise ValueError("Illegal character in input string")
+
+    raise AssertionError("input string is valid")  # pragma: no cover
+
+
+def _b16_validate(s: TextLike) -> bytes:
+    """
+    Return s as ascii bytes if it is valid base16, otherwise raise a ValueError.
+    """
+    if isinstance(s, str):
+        try:
+            data = s.encode("ascii")
+        except UnicodeEncodeError:
+            # non-ascii characters may change length when upper-cased, and the length
+            # check happens on the upper-cased string
+            s = s.upper()
+            if len(s) % 2 != 0:
+                raise ValueError("Input string must have length divisible by 2.")
+            _b16_raise(s)
+    else:
+        data = _as_bytes(s)
+
+    if len(data) % 2 != 0:
         raise ValueError("Input string must have length divisible by 2.")
 
-    quanta = (s[i : i + codes_in_quantum] for i in range(0, len(s), codes_in_quantum))
-    for quantum in quanta:
-        for code in quantum:
-            byte <<= 4
-            if code in _B16_DECODE:
-                byte += _B16_DECODE[code]
-            else:
-                raise ValueError("Illegal character in input string")
-        out.append(byte)
-        byte = 0
+    if data.translate(None, _B16_ALPHABET_ANY_CASE):
+        _b16_raise(data.decode("latin-1"))
+
+    return data
+
+
+def _b16dec_quanta(data: bytes) -> bytes:
+    quartets = data.translate(_B16_DECODE)
+    return _or_bytes(quartets[0::2].translate(_SHL4), quartets[1::2])
+
+
+def b16dec_into(s: TextLike, out: Union[bytearray, memoryview]) -> int:
+    """
+    Decode base16 s into the start of the writable buffer out and return the number of
+    bytes written. s may be a str or any bytes-like object.
+    """
+    data = _b16_validate(s)
+    out_len = len(data) // 2
+
+    if len(out) < out_len:
+        raise ValueError(f"Output buffer must hold at least {out_len} bytes.")
 
+    return _b16dec_validated_into(data, memoryview(out))
+
+
+def _b16dec_validated_into(data: bytes, view: memoryview) -> int:
+    for start in range(0, len(data), _CHUNK_SZ):
+        chunk = data[start : start + _CHUNK_SZ]
+        view[start // 2 : (start + len(chunk)) // 2] = _b16dec_quanta(chunk)
+
+    return len(data) // 2
+
+
+def b16dec(s: TextLike) -> bytes:
+    data = _b16_validate(s)
+    out = bytearray(len(data) // 2)
+    _b16dec_validated_into(data, memoryview(out))
     return bytes(out)
 
 
-def b64enc(s: bytes) -> str:
-    bits_in_quantum = 24
-    buf = 0
-    bits_in_buf = 0
-    out = []
-
-    for c in s:
-        # keep feeding bits into buffer...
-        buf <<= 8
-        buf += c
-        bits_in_buf += 8
-
-        # until buffer has 24 bits
-        if bits_in_buf == bits_in_quantum:
-            # use masks and shifts to obtain the 6 bits of each code
-            sextet_0 = (buf & 0xFC0000) >> 18
-            sextet_1 = (buf & 0x3F000) >> 12
-            sextet_2 = (buf & 0xFC0) >> 6
-            sextet_3 = buf & 0x3F
-
-            # lookup those codes in code dict and add them to output
-            out.extend(
-                [
-                    _B64_ENCODE[sextet_0],
-                    _B64_ENCODE[sextet_1],
-                    _B64_ENCODE[sextet_2],
-                    _B64_ENCODE[sextet_3],
-                ]
+def _b64enc_quanta(s: bytes) -> bytearray:
+    # s is a run of whole 3 byte quanta. bytes x, y, z become sextets:
+    #   xxxxxx xxyyyy yyyyzz zzzzzz
+    x, y, z = (s[i::3] for i in range(3))
+
+    out = bytearray(len(s) // 3 * 4)
+    out[0::4] = x.translate(_SHR2)
+    out[1::4] = _or_bytes(x.translate(_LO2_SHL4), y.translate(_SHR4))
+    out[2::4] = _or_bytes(y.translate(_LO4_SHL2), z.translate(_SHR6))
+    out[3::4] = z
+
+    return out.translate(_B64_ENCODE)
+
+
+def b64enc(s: BytesLike) -> str:
+    s = _as_bytes(s)
+    # a multiple of 3 so that chunks never split a quantum
+    chunk_sz = _CHUNK_SZ // 4 * 3
+    whole_len = len(s) - len(s) % 3
+
+    out = [
+        _b64enc_quanta(s[start : min(start + chunk_sz, whole_len)])
+        for start in range(0, whole_len, chunk_sz)
+    ]
+
+    # if there are remaining bytes, encode them as if zero-filled to a whole quantum,
+    # then replace the codes that only contain fill bits with padding.
+    remaining = len(s) - whole_len
+    if remaining:
+        last = _b64enc_quanta(s[whole_len:] + b"\x00" * (3 - remaining))
+        out.append(last[: remaining + 1] + PAD_CHAR.encode("ascii") * (3 - remaining))
+
+    return b"".join(out).decode("ascii")
+
+
+def b16enc(s: BytesLike) -> str:
+    s = _as_bytes(s)
+
+    out = bytearray(len(s) * 2)
+    out[0::2] = s.translate(_B16_ENCODE_HI)
+    out[1::2] = s.translate(_B16_ENCODE_LO)
+
+    return out.decode("ascii")
+
+
+_LINE_BREAKS = b"\r\n"
+
+
+def _strip_line_breaks(chunk: TextLike) -> bytes:
+    if isinstance(chunk, str):
+        # non-ascii characters are kept (as something that is never valid) so that
+        # they are still reported as illegal
+        data = chunk.encode("ascii", errors="replace")
+    else:
+        data = _as_bytes(chunk)
+    return data.translate(None, _LINE_BREAKS)
+
+
+class _Decoder(ABC):
+    """
+    Incremental decoder. Chunks of encoded text are fed to update(), which returns the
+    bytes of every quantum completed so far. Line breaks are ignored, and a partial
+    quantum at the end of a chunk is carried over to the next one.
+    """
+
+    _codes_in_quantum: int
+
+    def __init__(self) -> None:
+        self._pending = b""
+        self._finished = False
+
+    @abstractmethod
+    def _decode(self, data: bytes) -> bytes: ...
+
+    def update(self, chunk: TextLike) -> bytes:
+        data = self._pending + _strip_line_breaks(chunk)
+        whole_len = len(data) - len(data) % self._codes_in_quantum
+        self._pending = data[whole_len:]
+
+        if not whole_len:
+            return b""
+
+        if self._finished:
+            raise ValueError("Found padding character in middle of input string")
+
+        return self._decode(data[:whole_len])
+
+    def finalize(self) -> bytes:
+        if self._pending:
+            raise ValueError(
+                "Input string must have length divisible by "
+                f"{self._codes_in_quantum}."
             )
+        return b""
+
+
+class B64Decoder(_Decoder):
+    _codes_in_quantum = 4
+
+    def _decode(self, data: bytes) -> bytes:
+        decoded = b64dec(data)
+        # a padded quantum must be the last one
+        self._finished = data.endswith(PAD_CHAR.encode("ascii"))
+        return decoded
+
+
+class B16Decoder(_Decoder):
+    _codes_in_quantum = 2
+
+    def _decode(self, data: bytes) -> bytes:
+        return b16dec(data)
+
+
+class B64Encoder:
+    """
+    Incremental encoder. Bytes fed to update() are encoded as far as whole quanta allow,
+    and finalize() encodes (and pads) whatever is left.
+    """
+
+    def __init__(self) -> None:
+        self._pending = b""
+
+    def update(self, chunk: BytesLike) -> str:
+        data = self._pending + _as_bytes(chunk)
+        whole_len = len(data) - len(data) % 3
+        self._pending = data[whole_len:]
+        return b64enc(data[:whole_len])
+
+    def finalize(self) -> str:
+        out = b64enc(self._pending)
+        self._pending = b""
+        return out
+
+
+class B16Encoder:
+    """
+    Incremental encoder. Every byte is a whole quantum in base16, so this keeps no
+    state, but has the same interface as B64Encoder.
+    """
+
+    def update(self, chunk: BytesLike) -> str:
+        return b16enc(chunk)
+
+    def finalize(self) -> str:
+        return ""
+
+
+def b64dec_stream(chunks: Iterable[TextLike]) -> Iterator[bytes]:
+    """
+    Decode an iterable of base64 chunks (such as the lines of a file) as it is consumed.
+    """
+    decoder = B64Decoder()
+    for chunk in chunks:
+        decoded = decoder.update(chunk)
+        if decoded:
+            yield decoded
+    decoder.finalize()
+
 
-            buf = 0
-            bits_in_buf = 0
-
-    # if there are remaining bits in the buffer...
-    if bits_in_buf == 16:
-        # 16 bits left means 1 pad character needs to be added
-        sextet_0 = (buf & 0xFC00) >> 10
-        sextet_1 = (buf & 0x3F0) >> 4
-        sextet_2 = (buf & 0xF) << 2
-        out.extend(
-            [
-                _B64_ENCODE[sextet_0],
-                _B64_ENCODE[sextet_1],
-                _B64_ENCODE[sextet_2],
-                PAD_CHAR,
-            ]
-        )
-    elif bits_in_buf == 8:
-        # 8 bits left means 2 pad characters need to be added
-        sextet_0 = (buf & 0xFC) >> 2
-        sextet_1 = (buf & 0x3) << 4
-        out.extend(
-            [
-                _B64_ENCODE[sextet_0],
-                _B64_ENCODE[sextet_1],
-                PAD_CHAR,
-                PAD_CHAR,
-            ]
-        )
-
-    return "".join(out)
-
-
-def b16enc(s: bytes) -> str:
-    out = []
-
-    for c in s:
-        quartet_0 = (c & 0xF0) >> 4
-        quartet_1 = c & 0xF
-        out.extend(
-            [
-                _B16_ENCODE[quartet_0],
-                _B16_ENCODE[quartet_1],
-            ]
-        )
-
-    return "".join(out)
+def b16dec_stream(chunks: Iterable[TextLike]) -> Iterator[bytes]:
+    """
+    Decode an iterable of base16 chunks (such as the lines of a file) as it is consumed.
+    """
+    decoder = B16Decoder()
+    for chunk in chunks:
+        decoded = decoder.update(chunk)
+        if decoded:
+            yield decoded
+    decoder.finalize()
@@ -0,0 +1,220 @@
+from __future__ import annotations
+from array import array
+import mmap
+import os
+from collections.abc import Iterator
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Optional, Union, overload
+
+try:
+    import numpy as np
+
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+# line indexes are cached next to the file they index, as <file name><INDEX_SUFFIX>
+INDEX_SUFFIX = ".lineidx"
+
+# the cached index is an array of unsigned 64-bit ints: a header of the magic number,
+# the size and the modification time of the indexed file, followed by the offset of
+# the end of every line
+_INDEX_MAGIC = 0x786469656E696C  # b"linedix" read as a little-endian int
+_INDEX_HEADER_LEN = 3
+
+# bytes searched for line breaks at a time while building an index
+_SCAN_CHUNK_SZ = 1 << 24
+
+_WHITESPACE = b" \t\r\n\x0b\x0c"
+
+
+def _line_ends(mm: mmap.mmap) -> array[int]:
+    ends: array[int] = array("Q")
+    size = len(mm)
+
+    if HAVE_NUMPY and size:
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        for start in range(0, size, _SCAN_CHUNK_SZ):
+            chunk = buf[start : start + _SCAN_CHUNK_SZ]
+            newlines = np.flatnonzero(chunk == ord("\n")).astype(np.uint64) + start
+            ends.frombytes(newlines.tobytes())
+        del buf
+    else:
+        pos = mm.find(b"\n")
+        while pos != -1:
+            ends.append(pos)
+            pos = mm.find(b"\n", pos + 1)
+
+    # a last line without a line break still counts
+    if size and (not ends or ends[-1] != size - 1):
+        ends.append(size)
+
+    return ends
+
+
+def _index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+def _load_index(path: str, st: os.stat_result) -> Optional[array[int]]:
+    try:
+        with open(_index_path(path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    index: array[int] = array("Q")
+    if len(data) % index.itemsize:
+        return None
+    index.frombytes(data)
+
+    if list(index[:_INDEX_HEADER_LEN]) != [_INDEX_MAGIC, st.st_size, st.st_mtime_ns]:
+        return None
+    return index[_INDEX_HEADER_LEN:]
+
+
+def _save_index(path: str, st: os.stat_result, ends: array[int]) -> None:
+    idx_path = _index_path(path)
+    tmp_path = f"{idx_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            array("Q", [_INDEX_MAGIC, st.st_size, st.st_mtime_ns]).tofile(f)
+            ends.tofile(f)
+        # concurrent builders all write the same index, so the last one can win
+        os.replace(tmp_path, idx_path)
+    except OSError:
+        # the cache is only an optimization, e.g. the directory may be read-only
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+class LineCorpus:
+    """
+    The lines of a file, as memoryview slices of a read-only memory map of it, without
+    their surrounding whitespace.
+
+    Finding lines needs one pass over the file to build an index of their offsets,
+    which is cached on disk next to the file (unless cache_index is False) and reused
+    for as long as the file is unchanged.
+
+    A corpus can be indexed and iterated like a sequence, and sliced (or shard-ed) into
+    corpora of line ranges without copying. Corpora pickle as their path and line range,
+    so they can be sent to worker processes, which map the file themselves.
+
+    Slices and shards share the memory map of the corpus they came from, which only
+    that corpus closes: closing a slice or a shard does nothing.
+    """
+
+    def __init__(self, path: Union[str, Path], *, cache_index: bool = True):
+        self.path = os.fspath(path)
+        self._cache_index = cache_index
+
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            # empty files can't be mapped
+            self._mm: Optional[mmap.mmap] = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if st.st_size
+                else None
+            )
+
+        ends = _load_index(self.path, st) if cache_index else None
+        if ends is None:
+            ends = _line_ends(self._mm) if self._mm is not None else array("Q")
+            if cache_index:
+                _save_index(self.path, st, ends)
+
+        self._ends = ends
+        self._view = memoryview(self._mm if self._mm is not None else b"")
+        self._start = 0
+        self._stop = len(ends)
+        self._owns_map = True
+
+    def _shard(self, start: int, stop: int) -> LineCorpus:
+        shard = object.__new__(LineCorpus)
+        shard.__dict__.update(self.__dict__)
+        shard._start, shard._stop = start, stop
+        shard._owns_map = False
+        return shard
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (_open_shard, (self.path, self._cache_index, self._start, self._stop))
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def _line(self, line_idx: int) -> memoryview:
+        start = self._ends[line_idx - 1] + 1 if line_idx else 0
+        end = self._ends[line_idx]
+
+        view = self._view
+        while start < end and view[start] in _WHITESPACE:
+            start += 1
+        while end > start and view[end - 1] in _WHITESPACE:
+            end -= 1
+
+        return view[start:end]
+
+    @overload
+    def __getitem__(self, idx: int) -> memoryview: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> LineCorpus: ...
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[memoryview, LineCorpus]:
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            assert step == 1, "corpora can only be sliced into line ranges"
+            return self._shard(self._start + start, self._start + max(start, stop))
+
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("line index out of range")
+        return self._line(self._start + idx)
+
+    def __iter__(self) -> Iterator[memoryview]:
+        for line_idx in range(self._start, self._stop):
+            yield self._line(line_idx)
+
+    def shards(self, n: int) -> list[LineCorpus]:
+        """
+        Split the corpus into n (or fewer, if it has fewer lines) contiguous line
+        ranges of nearly equal length.
+        """
+        assert n > 0
+        n = min(n, len(self)) or 1
+        bounds = [self._start + len(self) * i // n for i in range(n + 1)]
+        return [self._shard(start, stop) for start, stop in zip(bounds, bounds[1:])]
+
+    def close(self) -> None:
+        if not self._owns_map:
+            return
+        # slices of lines that are still referenced keep the map open until they go
+        self._view.release()
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass
+
+    def __enter__(self) -> LineCorpus:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def _open_shard(path: str, cache_index: bool, start: int, stop: int) -> LineCorpus:
+    shard = LineCorpus(path, cache_index=cache_index)._shard(start, stop)
+    # nothing else refers to the corpus it was sliced from, so the shard closes the map
+    shard._owns_map = True
+    return shard
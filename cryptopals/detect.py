@@ -0,0 +1,192 @@
+from __future__ import annotations
+from functools import total_ordering
+import mmap
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Optional, Union
+
+from cryptopals.aes import BLK_SZ_BYTES
+from cryptopals.scan import TopK, batches, scan
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+@total_ordering
+class ECBDetection:
+    """
+    The repeated blocks of a ciphertext. positions maps each block that occurs more than
+    once to the indexes of the blocks it occurs at, and repeats counts the blocks that
+    are copies of an earlier one. ECB encrypts equal plaintext blocks equally, so the
+    more repeats, the likelier the ciphertext is ECB.
+
+    Detections order by repeats, and then by idx, the position of the ciphertext in its
+    corpus (lower first).
+    """
+
+    def __init__(self, *, idx: int, n_blks: int, positions: dict[bytes, list[int]]):
+        self.idx = idx
+        self.n_blks = n_blks
+        self.positions = positions
+        self.repeats = sum(len(blk_idxs) - 1 for blk_idxs in positions.values())
+
+    def _key(self) -> tuple[int, int]:
+        return (self.repeats, -self.idx)
+
+    def __eq__(self, o: object) -> bool:
+        return isinstance(o, ECBDetection) and self._key() == o._key()
+
+    def __lt__(self, o: object) -> bool:
+        return isinstance(o, ECBDetection) and self._key() < o._key()
+
+    def __repr__(self) -> str:
+        return f"ECBDetection(idx={self.idx}, repeats={self.repeats})"
+
+
+def repeated_blocks(
+    ct: BytesLike, blk_sz: int = BLK_SZ_BYTES
+) -> dict[bytes, list[int]]:
+    """
+    Return each block that occurs more than once in ct, mapped to the indexes of the
+    blocks it occurs at.
+    """
+    # memoryview slices hash and compare like the bytes they view, without copying them
+    # out. only views of read-only buffers are hashable, so writable ones are copied.
+    view = memoryview(ct)
+    if not view.readonly:
+        view = memoryview(bytes(view))
+    n_blks = len(view) // blk_sz
+    blks = [view[i : i + blk_sz] for i in range(0, n_blks * blk_sz, blk_sz)]
+
+    # almost every ciphertext has no repeats, and a set is the fastest way to tell
+    if len(set(blks)) == n_blks:
+        return {}
+
+    positions: dict[memoryview, list[int]] = {}
+    for blk_idx, blk in enumerate(blks):
+        positions.setdefault(blk, []).append(blk_idx)
+
+    return {
+        bytes(blk): blk_idxs for blk, blk_idxs in positions.items() if len(blk_idxs) > 1
+    }
+
+
+# (repeats, -idx, n_blks, positions). negating idx makes earlier ciphertexts win ties.
+_Candidate = tuple[int, int, int, dict[bytes, list[int]]]
+
+
+def _detect_batch(
+    start_idx: int,
+    cts: Iterable[BytesLike],
+    blk_sz: int,
+    top_k: Optional[int],
+    min_repeats: int,
+) -> list[_Candidate]:
+    best: TopK[_Candidate] = TopK(top_k)
+
+    for idx, ct in enumerate(cts, start_idx):
+        positions = repeated_blocks(ct, blk_sz)
+        repeats = sum(len(blk_idxs) - 1 for blk_idxs in positions.values())
+        if repeats >= min_repeats:
+            best.push((repeats, -idx, len(ct) // blk_sz, positions))
+
+    return best.heap
+
+
+def _detect_file_batch(
+    path: str,
+    record_sz: int,
+    start_idx: int,
+    end_idx: int,
+    blk_sz: int,
+    top_k: Optional[int],
+    min_repeats: int,
+) -> list[_Candidate]:
+    # each worker maps the file itself, so that only the record range is sent to it
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            records = (
+                view[idx * record_sz : (idx + 1) * record_sz]
+                for idx in range(start_idx, end_idx)
+            )
+            return _detect_batch(start_idx, records, blk_sz, top_k, min_repeats)
+        finally:
+            view.release()
+
+
+def _results(best: TopK[_Candidate]) -> list[ECBDetection]:
+    return [
+        ECBDetection(idx=-neg_idx, n_blks=n_blks, positions=positions)
+        for _, neg_idx, n_blks, positions in best.best()
+    ]
+
+
+def detect_ecb(
+    corpus: Iterable[BytesLike],
+    blk_sz: int = BLK_SZ_BYTES,
+    *,
+    top_k: Optional[int] = None,
+    min_repeats: int = 1,
+    workers: int = 1,
+    batch_sz: int = 4096,
+) -> list[ECBDetection]:
+    """
+    Return the ciphertexts of corpus with at least min_repeats repeated blocks, most
+    repeats first (and only the top_k of them, if given).
+
+    With more than 1 worker, ciphertexts are consumed lazily in batches of batch_sz and
+    checked by a pool of processes, with only a few batches per worker in flight.
+    """
+    best: TopK[_Candidate] = TopK(top_k)
+
+    tasks: Iterable[tuple[int, Iterable[BytesLike], int, Optional[int], int]]
+    if workers == 1:
+        # the whole corpus in one go, without copying its ciphertexts for pickling
+        tasks = [(0, corpus, blk_sz, top_k, min_repeats)]
+    else:
+        tasks = (
+            (start_idx, [bytes(ct) for ct in batch], blk_sz, top_k, min_repeats)
+            for start_idx, batch in batches(corpus, batch_sz)
+        )
+    for candidates in scan(_detect_batch, tasks, workers):
+        best.extend(candidates)
+
+    return _results(best)
+
+
+def detect_ecb_file(
+    path: Union[str, Path],
+    record_sz: int,
+    blk_sz: int = BLK_SZ_BYTES,
+    *,
+    top_k: Optional[int] = None,
+    min_repeats: int = 1,
+    workers: int = 1,
+    batch_sz: int = 65536,
+) -> list[ECBDetection]:
+    """
+    Like detect_ecb, for a binary file of back-to-back ciphertexts of record_sz bytes
+    each (a trailing partial record is ignored). The file is memory-mapped rather than
+    read, and with more than 1 worker, each one maps it and checks its own ranges of
+    records.
+    """
+    best: TopK[_Candidate] = TopK(top_k)
+    path = os.fspath(path)
+    n_records = os.path.getsize(path) // record_sz
+    tasks = (
+        (
+            path,
+            record_sz,
+            start,
+            min(start + batch_sz, n_records),
+            blk_sz,
+            top_k,
+            min_repeats,
+        )
+        for start in range(0, n_records, batch_sz)
+    )
+    for candidates in scan(_detect_file_batch, tasks, workers):
+        best.extend(candidates)
+
+    return _results(best)
@@ -1,22 +1,88 @@
-def hamming_distance(a: bytes, b: bytes) -> int:
+from __future__ import annotations
+from collections.abc import Sequence
+from typing import Union
+
+try:
+    import numpy as np
+
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+if HAVE_NUMPY:
+    # number of set bits in each byte value
+    _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# upper bound on the number of bytes xor-ed at once by pairwise_hamming, to keep its
+# temporary arrays small
+_PAIRWISE_CHUNK_BYTES = 1 << 24
+
+
+def _popcount(x: int) -> int:
+    # int.bit_count is only available from python 3.10
+    return x.bit_count() if _HAVE_BIT_COUNT else bin(x).count("1")
+
+
+_HAVE_BIT_COUNT = hasattr(int, "bit_count")
+
+
+def hamming_distance(a: BytesLike, b: BytesLike) -> int:
     assert len(a) == len(b)
 
-    dist = 0
+    # xor the whole buffers in one go as big integers, then count the differing bits
+    return _popcount(int.from_bytes(a, "big") ^ int.from_bytes(b, "big"))
+
+
+def pairwise_hamming(blocks: Sequence[BytesLike]) -> list[list[int]]:
+    """
+    Return the matrix of hamming distances between every pair of the equal-size blocks,
+    where row i, column j is the distance between blocks[i] and blocks[j].
+    """
+    if not blocks:
+        return []
+
+    blk_sz = len(blocks[0])
+    assert all(len(blk) == blk_sz for blk in blocks)
+
+    if HAVE_NUMPY:
+        return list(_pairwise_hamming_np(blocks, blk_sz).tolist())
+
+    ints = [int.from_bytes(blk, "big") for blk in blocks]
+    return [[_popcount(a ^ b) for b in ints] for a in ints]
+
+
+def _pairwise_hamming_np(blocks: Sequence[BytesLike], blk_sz: int) -> np.ndarray:
+    n = len(blocks)
+    mat = np.frombuffer(b"".join(blocks), dtype=np.uint8).reshape(n, blk_sz)
+
+    if hasattr(np, "bitwise_count"):
+        # zero padding doesn't change distances, and lets 8 bytes be xor-ed and
+        # counted at a time
+        mat = np.pad(mat, ((0, 0), (0, -blk_sz % 8))).view(np.uint64)
+
+        def popcount(xored: np.ndarray) -> np.ndarray:
+            counts: np.ndarray = np.bitwise_count(xored)
+            return counts
+
+    else:
 
-    for a_byte, b_byte in zip(a, b):
-        dist += _hamming_distance_byte(a_byte, b_byte)
+        def popcount(xored: np.ndarray) -> np.ndarray:
+            counts: np.ndarray = _POPCOUNT[xored]
+            return counts
 
-    return dist
+    dists = np.empty((n, n), dtype=np.int64)
 
+    # xor a few rows against every block at a time
+    rows_per_chunk = max(1, _PAIRWISE_CHUNK_BYTES // max(1, mat.nbytes))
+    for start in range(0, n, rows_per_chunk):
+        xored = mat[start : start + rows_per_chunk, None, :] ^ mat[None, :, :]
+        dists[start : start + rows_per_chunk] = popcount(xored).sum(
+            axis=2, dtype=np.int64
+        )
 
-def _hamming_distance_byte(a: int, b: int) -> int:
-    z = a ^ b
-    dist = 0
-    while z:
-        if z & 1:
-            dist += 1
-        z >>= 1
-    return dist
+    return dists
 
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+from __future__ import annotations
+import time
+from typing import Callable, Optional
+
+from cryptopals.oracle import Encryptor
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class OracleStats:
+    """
+    What an oracle has been through: how many queries it answered, how many bytes went
+    in and out, and how long it took.
+
+    latency_histogram maps a latency bucket to the number of queries in it. Buckets are
+    powers of 2 in microseconds, and each holds the queries that took less than its
+    value (and at least half of it).
+    """
+
+    def __init__(
+        self,
+        *,
+        queries: int,
+        bytes_in: int,
+        bytes_out: int,
+        seconds: float,
+        latency_histogram: dict[int, int],
+    ) -> None:
+        self.queries = queries
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.seconds = seconds
+        self.latency_histogram = latency_histogram
+
+    @property
+    def mean_latency(self) -> float:
+        return self.seconds / self.queries if self.queries else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"OracleStats(queries={self.queries}, bytes_in={self.bytes_in}, "
+            f"bytes_out={self.bytes_out}, seconds={self.seconds:.6f})"
+        )
+
+
+class MeteredEncryptor:
+    """
+    Wraps any Encryptor to account for what attacks spend on it. Every query is counted
+    and timed, and the totals come back from stats().
+
+    If max_queries is given, queries after that many raise QueryBudgetExceeded (without
+    reaching the wrapped encryptor). If max_rate is given, queries are delayed so that
+    no more than max_rate of them start per second.
+    """
+
+    def __init__(
+        self,
+        encryptor: Encryptor,
+        *,
+        max_queries: Optional[int] = None,
+        max_rate: Optional[float] = None,
+        clock: Callable[[], float] = time.perf_counter,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.encryptor = encryptor
+        self.max_queries = max_queries
+        self.max_rate = max_rate
+        self._clock = clock
+        self._sleep = sleep
+        self._next_start = 0.0
+        self.reset()
+
+    def reset(self) -> None:
+        self._queries = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._seconds = 0.0
+        self._latency_histogram: dict[int, int] = {}
+
+    def encrypt(self, plaintext: bytes) -> bytes:
+        if self.max_queries is not None and self._queries >= self.max_queries:
+            raise QueryBudgetExceeded(f"Oracle budget of {self.max_queries} queries")
+
+        if self.max_rate is not None:
+            wait = self._next_start - self._clock()
+            if wait > 0:
+                self._sleep(wait)
+            self._next_start = max(self._next_start, self._clock()) + 1 / self.max_rate
+
+        start = self._clock()
+        ciphertext = self.encryptor.encrypt(plaintext)
+        elapsed = self._clock() - start
+
+        self._queries += 1
+        self._bytes_in += len(plaintext)
+        self._bytes_out += len(ciphertext)
+        self._seconds += elapsed
+
+        bucket = 1 << int(elapsed * 1_000_000).bit_length()
+        self._latency_histogram[bucket] = self._latency_histogram.get(bucket, 0) + 1
+
+        return ciphertext
+
+    def stats(self) -> OracleStats:
+        return OracleStats(
+            queries=self._queries,
+            bytes_in=self._bytes_in,
+            bytes_out=self._bytes_out,
+            seconds=self._seconds,
+            latency_histogram=dict(sorted(self._latency_histogram.items())),
+        )
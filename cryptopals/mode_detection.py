@@ -0,0 +1,171 @@
+"""
+Monte Carlo measurement of how well ECB and CBC can be told apart, for the encryption
+oracle of https://cryptopals.com/sets/2/challenges/11, given a chosen plaintext.
+
+Run it with `python -m cryptopals.mode_detection --help`.
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+
+from cryptopals.aes import BLK_SZ_BYTES, encrypt_batch
+from cryptopals.detect import repeated_blocks
+from cryptopals.oracle import random_encryption_job
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+MODES = ("ecb", "cbc")
+
+# trials per task handed to a worker. every task has its own seed, derived from the
+# run's seed and the task's index, so results don't depend on the number of workers.
+_TASK_TRIALS = 4096
+
+
+def detect_mode(ct: BytesLike, blk_sz: int = BLK_SZ_BYTES) -> str:
+    """
+    Guess the mode ct was encrypted with: ECB if any block repeats anywhere in it, CBC
+    otherwise. (A CBC ciphertext only repeats a block by chance, about once in 2**64
+    pairs of blocks.)
+    """
+    return "ecb" if repeated_blocks(ct, blk_sz) else "cbc"
+
+
+class ModeDetectionResults:
+    """
+    The outcome of a number of detection trials. confusion[actual][guessed] counts the
+    trials encrypted in the actual mode that were detected as the guessed one.
+    """
+
+    def __init__(
+        self, *, confusion: dict[str, dict[str, int]], seconds: float = 0.0
+    ) -> None:
+        self.confusion = confusion
+        self.seconds = seconds
+
+    @classmethod
+    def empty(cls) -> ModeDetectionResults:
+        return cls(
+            confusion={actual: {guess: 0 for guess in MODES} for actual in MODES}
+        )
+
+    def merge(self, o: ModeDetectionResults) -> None:
+        for actual, guesses in o.confusion.items():
+            for guess, count in guesses.items():
+                self.confusion[actual][guess] += count
+
+    @property
+    def trials(self) -> int:
+        return sum(sum(guesses.values()) for guesses in self.confusion.values())
+
+    @property
+    def accuracy(self) -> float:
+        correct = sum(self.confusion[mode][mode] for mode in MODES)
+        return correct / self.trials if self.trials else 0.0
+
+    @property
+    def trials_per_s(self) -> float:
+        return self.trials / self.seconds if self.seconds else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"ModeDetectionResults(trials={self.trials}, accuracy={self.accuracy:.6f}, "
+            f"confusion={self.confusion})"
+        )
+
+    def report(self) -> str:
+        lines = [
+            f"trials: {self.trials}",
+            f"accuracy: {self.accuracy:.6f}",
+            f"trials/s: {self.trials_per_s:.0f}",
+            "actual \\ guessed " + " ".join(f"{guess:>10}" for guess in MODES),
+        ]
+        for actual in MODES:
+            counts = " ".join(f"{self.confusion[actual][g]:>10}" for g in MODES)
+            lines.append(f"{actual:>16} {counts}")
+        return "\n".join(lines)
+
+
+def _run_trials(plaintext: bytes, n_trials: int, seed: str) -> ModeDetectionResults:
+    rng = random.Random(seed)
+    modes = []
+    jobs = []
+    for _ in range(n_trials):
+        mode, job = random_encryption_job(plaintext, 16, rng)
+        modes.append(mode)
+        jobs.append(job)
+
+    results = ModeDetectionResults.empty()
+    # all of the task's trials are encrypted into one buffer in one go
+    for mode, ct in zip(modes, encrypt_batch(jobs)):
+        results.confusion[mode][detect_mode(ct)] += 1
+
+    return results
+
+
+def mode_detection_trials(
+    plaintext: bytes,
+    trials: int,
+    *,
+    seed: int = 0,
+    workers: Optional[int] = 1,
+) -> ModeDetectionResults:
+    """
+    Run trials encryptions of plaintext by the challenge 11 oracle, and detect the mode
+    of each with detect_mode.
+
+    With more than 1 worker (or None, for one per core), trials are run in tasks by a
+    pool of processes. The same seed always gives the same results, whatever the number
+    of workers.
+    """
+    if trials < 1:
+        raise ValueError("trials must be at least 1")
+    if workers is not None and workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    tasks = [
+        (plaintext, min(_TASK_TRIALS, trials - start), f"{seed}:{idx}")
+        for idx, start in enumerate(range(0, trials, _TASK_TRIALS))
+    ]
+    results = ModeDetectionResults.empty()
+    start_time = time.perf_counter()
+
+    if workers == 1:
+        for task in tasks:
+            results.merge(_run_trials(*task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for task_results in executor.map(_run_trials, *zip(*tasks)):
+                results.merge(task_results)
+
+    results.seconds = time.perf_counter() - start_time
+    return results
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m cryptopals.mode_detection",
+        description="Measure how accurately ECB and CBC are told apart, for chosen "
+        "plaintexts of repeated bytes of each length.",
+    )
+    parser.add_argument("lengths", nargs="+", type=int, help="plaintext lengths")
+    parser.add_argument("--trials", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="(default: one per core)"
+    )
+    args = parser.parse_args(argv)
+
+    for length in args.lengths:
+        results = mode_detection_trials(
+            b"A" * length, args.trials, seed=args.seed, workers=args.workers
+        )
+        print(f"plaintext length: {length}", results.report(), sep="\n", end="\n\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 from __future__ import annotations
+import asyncio
+import random
 import secrets
+from collections.abc import Generator
+from typing import Callable, Optional, Protocol, TypeVar, Union
 
-from cryptopals.aes import cbc_encrypt, ecb_encrypt, BLK_SZ_BYTES
+from cryptopals.aes import AESContext, encrypt_batch, BLK_SZ_BYTES
 from cryptopals.padding import pkcs7_pad
 from cryptopals.bintext import b64dec
 
+T = TypeVar("T")
+
 
 class RandomEncryption:
     def __init__(self, *, ciphertext: bytes, mode: str) -> None:
@@ -16,44 +22,55 @@ def _rand_key(sz: int) -> bytes:
     return secrets.token_bytes(sz)
 
 
-def _rand_iv(blk_sz: int) -> bytes:
-    return secrets.token_bytes(blk_sz)
+# secrets' source of randomness, behind the interface of random.Random
+_SYSTEM_RANDOM = secrets.SystemRandom()
 
+# a plaintext to encrypt with aes.encrypt_batch: (key, plaintext) in ECB mode, or
+# (key, plaintext, iv) in CBC mode
+EncryptJob = Union[tuple[bytes, bytes], tuple[bytes, bytes, bytes]]
 
-def _encrypt_with_rand_key(s: bytes, key_sz: int) -> RandomEncryption:
-    """
-    Return a RandomEncryption object of which our oracle should be able to determine the
-    mode.
 
-    The ciphertext in the object will be from a plaintext that has 5-10 random bytes
-    prefixed and suffixed to it. The encryption algorithm will be AES, with a 50-50
-    chance of being in ECB or CBC mode.
+def _rand_hex(rng: random.Random, n: int) -> bytes:
+    return rng.randbytes((n + 1) // 2).hex()[:n].encode("ascii")
 
-    The RandomEncryption object records the mode to create the ciphertext, but
-    obviously, this should only be used to verify our guess.
+
+def random_encryption_job(
+    s: bytes, key_sz: int, rng: random.Random
+) -> tuple[str, EncryptJob]:
+    """
+    Make every random choice of the encryption oracle of challenge 11 with rng, and
+    return the mode it picked along with the job that encrypts s that way.
+
+    The plaintext gets 5-10 random bytes prefixed and suffixed to it. The encryption
+    algorithm will be AES under a random key, with a 50-50 chance of being in ECB or CBC
+    mode (with a random iv).
     """
     # have the function append 5-10 bytes (count chosen randomly) before the plaintext
     # and 5-10 bytes after the plaintext.
     # i use hex strings instead of true random so that it's easier to decode later
-    rand_prefix = secrets.token_hex(secrets.choice(range(5, 11))).encode("utf-8")
-    rand_suffix = secrets.token_hex(secrets.choice(range(5, 11))).encode("utf-8")
+    rand_prefix = _rand_hex(rng, rng.randint(5, 10))
+    rand_suffix = _rand_hex(rng, rng.randint(5, 10))
+    pt = rand_prefix + s + rand_suffix
 
-    s = pkcs7_pad(rand_prefix + s + rand_suffix, BLK_SZ_BYTES)
+    use_ecb = rng.choice([True, False])
 
-    use_ecb = secrets.choice([True, False])
-
-    key = _rand_key(key_sz)
+    key = rng.randbytes(key_sz)
 
     if use_ecb:
-        return RandomEncryption(
-            ciphertext=ecb_encrypt(s, key),
-            mode="ecb",
-        )
-    else:
-        return RandomEncryption(
-            ciphertext=cbc_encrypt(s, key, _rand_iv(BLK_SZ_BYTES)),
-            mode="cbc",
-        )
+        return "ecb", (key, pt)
+    return "cbc", (key, pt, rng.randbytes(BLK_SZ_BYTES))
+
+
+def _encrypt_with_rand_key(s: bytes, key_sz: int) -> RandomEncryption:
+    """
+    Return a RandomEncryption object of which our oracle should be able to determine the
+    mode, from a ciphertext made as described in random_encryption_job.
+
+    The RandomEncryption object records the mode to create the ciphertext, but
+    obviously, this should only be used to verify our guess.
+    """
+    mode, job = random_encryption_job(s, key_sz, _SYSTEM_RANDOM)
+    return RandomEncryption(ciphertext=bytes(encrypt_batch([job])[0]), mode=mode)
 
 
 def oracle_guess(plaintext: bytes) -> bool:
@@ -92,6 +109,14 @@ def oracle_guess(plaintext: bytes) -> bool:
     return (rand_enc.mode == "ecb" and using_ecb) or not using_ecb
 
 
+class Encryptor(Protocol):
+    """
+    Anything the attacks can query with plaintexts of their choosing.
+    """
+
+    def encrypt(self, plaintext: bytes) -> bytes: ...
+
+
 class ECBRandEncryptor:
     """
     An object that can encrypt plaintexts with the same key. Plaintexts are appended-to
@@ -108,86 +133,367 @@ class ECBRandEncryptor:
 
     def __init__(self, key: bytes) -> None:
         self.key = key
+        # set up once, since the same key is used for every query
+        self._aes = AESContext(key)
+        self._unknown_data = b64dec(self.unknown_data)
 
     @classmethod
     def create(cls, key_sz: int = 16) -> ECBRandEncryptor:
         return cls(key=_rand_key(key_sz))
 
     def encrypt(self, plaintext: bytes) -> bytes:
-        return ecb_encrypt(
-            s=pkcs7_pad(plaintext + b64dec(self.unknown_data), BLK_SZ_BYTES),
-            key=self.key,
+        return self._aes.encrypt_blocks(
+            pkcs7_pad(plaintext + self._unknown_data, BLK_SZ_BYTES)
         )
 
 
-def discover_blk_sz(encryptor: ECBRandEncryptor) -> int:
+class AsyncEncryptor(Protocol):
     """
-    Return the block size of AES-128 in bytes. (lol, hint: it's 128 bits/16 bytes). But
-    this is an exercise for when the algorithm's properties are unknown.
+    Like Encryptor, for oracles that are slow to answer (e.g. over a network), so that
+    the attacks can have several queries in flight at once.
+    """
+
+    async def encrypt(self, plaintext: bytes) -> bytes: ...
+
+
+class OracleProfile:
+    """
+    What the discovery routines found out about an oracle that encrypts
+    prefix + our plaintext + secret, for attacks to reuse instead of rediscovering it.
+
+    mode is "ecb" if equal plaintext blocks encrypt to equal ciphertext blocks, and
+    "cbc" otherwise. prefix_len and secret_len can only be told apart in ECB mode, and
+    are None otherwise. data_len is always their total.
     """
 
-    blk_sz = 1
-    char = b"A"
+    def __init__(
+        self, *, blk_sz: int, mode: str, data_len: int, prefix_len: Optional[int]
+    ) -> None:
+        self.blk_sz = blk_sz
+        self.mode = mode
+        self.data_len = data_len
+        self.prefix_len = prefix_len
+        self.secret_len = None if prefix_len is None else data_len - prefix_len
+
+    def __repr__(self) -> str:
+        return (
+            f"OracleProfile(blk_sz={self.blk_sz}, mode={self.mode!r}, "
+            f"prefix_len={self.prefix_len}, secret_len={self.secret_len})"
+        )
 
-    while True:
-        # insert 2 blocks in of the same data
-        my_data = char * blk_sz * 2
-        ciphertext = encryptor.encrypt(my_data)
 
-        # then get 2 blocks from the ciphertext
-        blk_a = ciphertext[:blk_sz]
-        blk_b = ciphertext[blk_sz : blk_sz * 2]
+# an attack is written as a plan: a generator that yields lists of plaintexts to
+# encrypt, is sent back their ciphertexts (in the same order), and returns its result.
+# _run makes a plan's queries one at a time, and _run_async makes each list of them
+# concurrently, so both versions of every attack share all of its logic.
+_Plan = Generator[list[bytes], list[bytes], T]
+
+
+def _run(encryptor: Encryptor, plan: _Plan[T]) -> T:
+    try:
+        queries = next(plan)
+        while True:
+            queries = plan.send([encryptor.encrypt(pt) for pt in queries])
+    except StopIteration as stop:
+        result: T = stop.value
+        return result
+
+
+async def _run_async(encryptor: AsyncEncryptor, plan: _Plan[T]) -> T:
+    try:
+        queries = next(plan)
+        while True:
+            cts = await asyncio.gather(*(encryptor.encrypt(pt) for pt in queries))
+            queries = plan.send(list(cts))
+    except StopIteration as stop:
+        result: T = stop.value
+        return result
+
+
+def _first_true(
+    pred: Callable[[list[int]], _Plan[list[bool]]],
+    lo: int,
+    concurrency: int,
+    hi: Optional[int] = None,
+) -> _Plan[int]:
+    """
+    Return the smallest n > lo for which pred(n) is true, where pred is false up to some
+    n and true from then on. If hi is given, pred(hi) must be true. pred takes a list of
+    n to probe, and returns the result for each.
 
-        # see if they're equal
-        if blk_a == blk_b:
-            return blk_sz
+    Without hi, the search first doubles n until pred is true, then narrows down. Each
+    round probes up to concurrency n at once (so with a concurrency of 1, this is a
+    binary search), which takes O(log n) rounds either way.
+    """
+    bound = lo + 1
+    while hi is None:
+        probes = [bound << i for i in range(concurrency)]
+        results = yield from pred(probes)
+        hi = next((n for n, ok in zip(probes, results) if ok), None)
+        if hi is None:
+            lo = probes[-1]
+            bound = probes[-1] << 1
+
+    while hi - lo > 1:
+        step = max(1, (hi - lo) // (concurrency + 1))
+        probes = list(range(lo + step, hi, step))[:concurrency]
+        results = yield from pred(probes)
+        for n, ok in zip(probes, results):
+            if ok:
+                hi = n
+                break
+            lo = n
+
+    return hi
+
+
+def _length_jump(fill_char: bytes, concurrency: int) -> _Plan[tuple[int, int, int]]:
+    """
+    Return the shortest plaintext length that makes the ciphertext longer than for an
+    empty plaintext, the empty plaintext's ciphertext length, and the longer one.
+
+    Padding takes the ciphertext to the next whole block, so the first jump in length is
+    by exactly one block. And the jump happens once our plaintext fills the block the
+    unknown data ends in, so the unknown data is that much shorter than the ciphertext.
+    """
+    lengths: dict[int, int] = {}
 
-        blk_sz += 1
+    def ct_lengths(ns: list[int]) -> _Plan[list[int]]:
+        missing = [n for n in dict.fromkeys(ns) if n not in lengths]
+        if missing:
+            cts = yield [fill_char * n for n in missing]
+            lengths.update((n, len(ct)) for n, ct in zip(missing, cts))
+        return [lengths[n] for n in ns]
 
+    (initial_length,) = yield from ct_lengths([0])
 
-def discover_unknown_data_length(encryptor: ECBRandEncryptor, blk_sz: int) -> int:
-    my_data = b""
-    initial_length = len(encryptor.encrypt(my_data))
+    def grows(ns: list[int]) -> _Plan[list[bool]]:
+        ct_lens = yield from ct_lengths(ns)
+        return [ct_len > initial_length for ct_len in ct_lens]
 
-    # initial length contains padding, we know this.
-    # when the new data triggers an additional byte, we know that that many
-    # bytes filled the last block and caused a new padding block to be output.
-    # therefore, initial length - len(bytes that cause trigger) = original len
-    while True:
-        my_data += b"A"
-        new_length = len(encryptor.encrypt(my_data))
-        if new_length > initial_length:
-            return initial_length - len(my_data)
+    jump = yield from _first_true(grows, 0, concurrency)
+
+    return jump, initial_length, lengths[jump]
+
+
+def _alignment(
+    blk_sz: int, fill_char: bytes, concurrency: int
+) -> _Plan[Optional[tuple[int, int]]]:
+    """
+    Return the fewest fill characters that complete the block the prefix ends in, and
+    the index of the block after it. Or None, if equal blocks don't encrypt equally.
+
+    With that many fill characters (or more) ahead of two blocks' worth, the ciphertext
+    has two equal blocks in a row (in ECB mode).
+    """
+    repeats: dict[int, Optional[int]] = {}
+
+    def first_repeats(ns: list[int]) -> _Plan[list[Optional[int]]]:
+        missing = [n for n in dict.fromkeys(ns) if n not in repeats]
+        if missing:
+            cts = yield [fill_char * (n + 2 * blk_sz) for n in missing]
+            for n, ct in zip(missing, cts):
+                blks = [ct[i : i + blk_sz] for i in range(0, len(ct), blk_sz)]
+                repeats[n] = next(
+                    (i for i in range(len(blks) - 1) if blks[i] == blks[i + 1]), None
+                )
+        return [repeats[n] for n in ns]
+
+    def aligned(ns: list[int]) -> _Plan[list[bool]]:
+        blk_idxs = yield from first_repeats(ns)
+        return [blk_idx is not None for blk_idx in blk_idxs]
+
+    (is_aligned,) = yield from aligned([blk_sz - 1])
+    if not is_aligned:
+        return None
+
+    fill_count = yield from _first_true(aligned, -1, concurrency, hi=blk_sz - 1)
+    (blk_idx,) = yield from first_repeats([fill_count])
+    assert blk_idx is not None
+
+    return fill_count, blk_idx
+
+
+def _profile_oracle(concurrency: int) -> _Plan[OracleProfile]:
+    jump, initial_length, jumped_length = yield from _length_jump(b"A", concurrency)
+    blk_sz = jumped_length - initial_length
+    data_len = initial_length - jump
+
+    # the end of the prefix or the start of the secret could look like the fill, which
+    # makes it seem like fewer fill characters are needed. they can't look like two
+    # different fills though, so the one that needs the most is right.
+    alignments = []
+    for fill_char in (b"A", b"B"):
+        alignments.append((yield from _alignment(blk_sz, fill_char, concurrency)))
+    if None in alignments:
+        return OracleProfile(
+            blk_sz=blk_sz, mode="cbc", data_len=data_len, prefix_len=None
+        )
+
+    fill_count, blk_idx = max(a for a in alignments if a is not None)
+
+    return OracleProfile(
+        blk_sz=blk_sz,
+        mode="ecb",
+        data_len=data_len,
+        prefix_len=blk_idx * blk_sz - fill_count,
+    )
+
+
+def _discover_blk_sz(concurrency: int) -> _Plan[int]:
+    _, initial_length, jumped_length = yield from _length_jump(b"A", concurrency)
+    return jumped_length - initial_length
+
+
+def _discover_unknown_data_length(blk_sz: int, concurrency: int) -> _Plan[int]:
+    jump, initial_length, jumped_length = yield from _length_jump(b"A", concurrency)
+    # the length only jumps by a block if the oracle pads the way we think it does
+    if jumped_length - initial_length != blk_sz:
+        raise ValueError(
+            f"Ciphertext length jumped by {jumped_length - initial_length} bytes, not "
+            f"the block size of {blk_sz}"
+        )
+    return initial_length - jump
+
+
+def _crack_ecb_contents(blk_sz: int, contents_sz: int, prefix_len: int) -> _Plan[bytes]:
+    fill_char = b"A"
+    prefix_fill = fill_char * (-prefix_len % blk_sz)
+    codebook_start = prefix_len + len(prefix_fill)
+    codebook_end = codebook_start + 256 * blk_sz
+    contents = b""
+
+    while len(contents) < contents_sz:
+        known = fill_char * (blk_sz - 1) + contents
+        known = known[len(known) - (blk_sz - 1) :]
+        codebook = b"".join(known + bytes([b]) for b in range(256))
+
+        fill_count = blk_sz - 1 - len(contents) % blk_sz
+        (ciphertext,) = yield [prefix_fill + codebook + fill_char * fill_count]
+
+        blk_bytes = {
+            ciphertext[i : i + blk_sz]: b
+            for b, i in enumerate(range(codebook_start, codebook_end, blk_sz))
+        }
+        cur_blk_start = codebook_end + len(contents) // blk_sz * blk_sz
+        cur_blk = ciphertext[cur_blk_start : cur_blk_start + blk_sz]
+
+        if cur_blk not in blk_bytes:
+            raise ValueError(f"Couldn't crack byte #{len(contents)}")
+        contents += bytes([blk_bytes[cur_blk]])
+
+    return contents
+
+
+def _crack_ecb_secret(
+    profile: Optional[OracleProfile], concurrency: int
+) -> _Plan[bytes]:
+    if profile is None:
+        profile = yield from _profile_oracle(concurrency)
+    if profile.prefix_len is None or profile.secret_len is None:
+        raise ValueError(f"Oracle isn't in ECB mode: {profile}")
+
+    return (
+        yield from _crack_ecb_contents(
+            profile.blk_sz, profile.secret_len, profile.prefix_len
+        )
+    )
+
+
+# the sync attacks make one query at a time, so they never query more than needed
+def profile_oracle(encryptor: Encryptor) -> OracleProfile:
+    return _run(encryptor, _profile_oracle(concurrency=1))
+
+
+def discover_blk_sz(encryptor: Encryptor) -> int:
+    return _run(encryptor, _discover_blk_sz(concurrency=1))
+
+
+def discover_unknown_data_length(encryptor: Encryptor, blk_sz: int) -> int:
+    return _run(encryptor, _discover_unknown_data_length(blk_sz, concurrency=1))
 
 
 def crack_ecb_contents(
-    encryptor: ECBRandEncryptor,
+    encryptor: Encryptor,
     blk_sz: int,
     contents_sz: int,
+    prefix_len: int = 0,
 ) -> bytes:
-    cur_blk_idx = 0
+    return _run(encryptor, _crack_ecb_contents(blk_sz, contents_sz, prefix_len))
 
-    contents = b""
 
-    while True:
-        for fill_count in range(15, -1, -1):
-            plaintext = b"A" * fill_count
-            ciphertext = encryptor.encrypt(plaintext)
-            cur_blk = ciphertext[blk_sz * cur_blk_idx : blk_sz * (cur_blk_idx + 1)]
-
-            for byte in (bytes([b]) for b in range(256)):
-                brute_plaintext = plaintext + contents + byte
-                brute_ciphertext = encryptor.encrypt(brute_plaintext)
-                brute_blk = brute_ciphertext[
-                    blk_sz * cur_blk_idx : blk_sz * (cur_blk_idx + 1)
-                ]
-                if brute_blk == cur_blk:
-                    contents += byte
-                    break
-            else:
-                raise ValueError(f"Couldn't crack byte #{len(contents)}")
-
-            if len(contents) == contents_sz:
-                return contents
-
-        cur_blk_idx += 1
+def crack_ecb_secret(
+    encryptor: Encryptor, profile: Optional[OracleProfile] = None
+) -> bytes:
+    return _run(encryptor, _crack_ecb_secret(profile, concurrency=1))
+
+
+async def profile_oracle_async(
+    encryptor: AsyncEncryptor, concurrency: int = 16
+) -> OracleProfile:
+    """
+    Find out the block size, mode, prefix length and secret length of an oracle with
+    O(log(block size)) queries.
+    """
+    assert concurrency >= 1
+    return await _run_async(encryptor, _profile_oracle(concurrency))
+
+
+async def discover_blk_sz_async(
+    encryptor: AsyncEncryptor, concurrency: int = 16
+) -> int:
+    """
+    Return the block size of AES-128 in bytes. (lol, hint: it's 128 bits/16 bytes). But
+    this is an exercise for when the algorithm's properties are unknown.
+
+    It's the size of the first jump in ciphertext length as our plaintext grows, which
+    is found with O(log(block size)) queries.
+    """
+    assert concurrency >= 1
+    return await _run_async(encryptor, _discover_blk_sz(concurrency))
+
+
+async def discover_unknown_data_length_async(
+    encryptor: AsyncEncryptor, blk_sz: int, concurrency: int = 16
+) -> int:
+    assert concurrency >= 1
+    return await _run_async(
+        encryptor, _discover_unknown_data_length(blk_sz, concurrency)
+    )
+
+
+async def crack_ecb_secret_async(
+    encryptor: AsyncEncryptor, profile: Optional[OracleProfile] = None
+) -> bytes:
+    """
+    Recover the secret an ECB oracle appends to our plaintexts, profiling the oracle
+    first unless a profile of it is given.
+    """
+    return await _run_async(encryptor, _crack_ecb_secret(profile, concurrency=16))
+
+
+async def crack_ecb_contents_async(
+    encryptor: AsyncEncryptor,
+    blk_sz: int,
+    contents_sz: int,
+    prefix_len: int = 0,
+) -> bytes:
+    """
+    Recover the unknown data that encryptor appends to our plaintexts, one byte at a
+    time, with a single query per byte.
+
+    Each query starts with a codebook: 256 blocks made of the blk_sz - 1 bytes right
+    before the unknown byte, followed by each possible value of that byte. After the
+    codebook comes just enough fill that the unknown byte lands at the end of a block,
+    right after those same blk_sz - 1 bytes. ECB encrypts equal blocks equally, so that
+    block's ciphertext is also in the codebook, under the right byte value.
+
+    If the oracle puts prefix_len bytes ahead of our plaintext, the query first fills
+    the rest of the prefix's last block.
+
+    There is nothing to run concurrently here: the codebook already tries every value
+    of a byte in one query, and each query needs the bytes cracked before it.
+    """
+    return await _run_async(
+        encryptor, _crack_ecb_contents(blk_sz, contents_sz, prefix_len)
+    )
@@ -1,24 +1,92 @@
-def pkcs7_pad(s: bytes, blk_sz: int) -> bytes:
+from typing import Optional, Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# pkcs7 pads are counted in a single byte
+_MAX_BLK_SZ = 255
+
+# _ONES[n] is n 0x01 bytes as an int, so that multiplying it by a pad value makes the
+# int of a pad of that value filling n bytes
+_ONES = [int.from_bytes(b"\x01" * n, "big") for n in range(_MAX_BLK_SZ + 1)]
+# _LOW_BYTES[n] masks the low n bytes of an int
+_LOW_BYTES = [(1 << (8 * n)) - 1 for n in range(_MAX_BLK_SZ + 1)]
+
+
+def _check_blk_sz(blk_sz: int) -> None:
+    if not (isinstance(blk_sz, int) and 0 < blk_sz <= _MAX_BLK_SZ):
+        raise ValueError("blk_sz must be an integer in range [1, 255] inclusive.")
+
+
+def _pad(s_len: int, blk_sz: int) -> bytes:
+    _check_blk_sz(blk_sz)
+    padding_to_add = blk_sz - (s_len % blk_sz)
+    return bytes([padding_to_add]) * padding_to_add
+
+
+def pkcs7_pad(s: BytesLike, blk_sz: int) -> bytes:
     """
     pads s to a block size of blk_sz bytes
     """
-    assert 0 < blk_sz < 256, "blk_sz must be in range [1, 255] inclusive."
-    assert int(blk_sz) == blk_sz, "blk_sz must be an integer"
+    return b"".join((s, _pad(len(s), blk_sz)))
 
-    padding_to_add = blk_sz - (len(s) % blk_sz)
 
-    return s + bytes([padding_to_add]) * padding_to_add
+def pkcs7_pad_inplace(buf: bytearray, blk_sz: int) -> int:
+    """
+    pads buf to a block size of blk_sz bytes by extending it, and returns the number of
+    pad bytes added
+    """
+    pad = _pad(len(buf), blk_sz)
+    buf += pad
+    return len(pad)
+
+
+def _pad_len(tail: memoryview) -> int:
+    # the length of the pkcs7 pad at the end of tail, or 0 if there isn't a valid one.
+    # every tail of the same length takes the same steps whatever its contents, so how
+    # long this takes tells nothing about why a pad was rejected. (it's only as
+    # constant-time as python's arithmetic on small ints, of course.)
+    n = tail[-1]
+    window = len(tail)
+
+    # the pad value must be in [1, window]. one of the differences is negative exactly
+    # when it isn't, which sets every bit above the low byte.
+    out_of_range = ((n - 1) | (window - n)) >> 8 & 1
+
+    # xor-ing the tail with n in every byte leaves zeros in the bytes of a good pad.
+    # the value is clamped so that the mask is built the same way either way.
+    clamped = n * (1 - out_of_range) + out_of_range
+    diff = int.from_bytes(tail, "big") ^ (clamped * _ONES[window])
+    mismatch = diff & _LOW_BYTES[clamped]
 
+    invalid = out_of_range | (mismatch != 0)
+    return n * (1 - invalid)
 
-def pkcs7_unpad(s: bytes) -> bytes:
+
+def validate_pkcs7(buf: BytesLike, blk_sz: int) -> int:
     """
-    unpads s from a block size of blk_sz bytes
+    Return the length of the pkcs7 pad of buf (padded to a block size of blk_sz bytes),
+    or 0 if its padding isn't valid. Only the last block of buf is looked at, without
+    copying it.
     """
+    _check_blk_sz(blk_sz)
+    if not buf or len(buf) % blk_sz:
+        return 0
+    return _pad_len(memoryview(buf)[-blk_sz:])
+
 
-    padding_to_remove = s[-1]
+def pkcs7_unpad(s: BytesLike, blk_sz: Optional[int] = None) -> bytes:
+    """
+    unpads s from a block size of blk_sz bytes. without blk_sz, any pad that fits in s
+    is accepted. raises ValueError if the padding isn't valid.
+    """
+    if blk_sz is not None:
+        padding_to_remove = validate_pkcs7(s, blk_sz)
+    elif s:
+        padding_to_remove = _pad_len(memoryview(s)[-_MAX_BLK_SZ:])
+    else:
+        padding_to_remove = 0
 
-    assert all(
-        byte == padding_to_remove for byte in s[len(s) - padding_to_remove :]
-    ), "pad characters are not consistent"
+    if not padding_to_remove:
+        raise ValueError("pad characters are not consistent")
 
-    return s[:-padding_to_remove]
+    return bytes(memoryview(s)[:-padding_to_remove])
@@ -0,0 +1,270 @@
+from __future__ import annotations
+import asyncio
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Generator
+from typing import Optional, Protocol
+
+from cryptopals.aes import BLK_SZ_BYTES, cbc_decrypt, cbc_encrypt
+from cryptopals.bintext import b64dec
+from cryptopals.padding import pkcs7_pad, pkcs7_unpad, validate_pkcs7
+from cryptopals.score import ENGLISH_SCORER, Scorer
+
+
+class PaddingOracle(Protocol):
+    """
+    Anything that tells whether a ciphertext decrypts (in CBC mode, under a key we don't
+    know) to a plaintext with valid pkcs7 padding.
+    """
+
+    def is_valid_padding(self, iv: bytes, ct: bytes) -> bool: ...
+
+
+class AsyncPaddingOracle(Protocol):
+    """
+    Like PaddingOracle, for oracles that are slow to answer, so that the attack can have
+    several queries in flight at once.
+    """
+
+    async def is_valid_padding(self, iv: bytes, ct: bytes) -> bool: ...
+
+
+class CBCPaddingOracle:
+    """
+    A stand-in for the server of https://cryptopals.com/sets/3/challenges/17, which
+    hands out encrypted strings and then leaks whether the ciphertexts sent back to it
+    decrypt with valid padding.
+    """
+
+    strings = (
+        "MDAwMDAwTm93IHRoYXQgdGhlIHBhcnR5IGlzIGp1bXBpbmc=",
+        "MDAwMDAxV2l0aCB0aGUgYmFzcyBraWNrZWQgaW4gYW5kIHRoZSBWZWdhJ3MgYXJlIHB1bXBpbic=",
+        "MDAwMDAyUXVpY2sgdG8gdGhlIHBvaW50LCB0byB0aGUgcG9pbnQsIG5vIGZha2luZw==",
+        "MDAwMDAzQ29va2luZyBNQydzIGxpa2UgYSBwb3VuZCBvZiBiYWNvbg==",
+        "MDAwMDA0QnVybmluZyAnZW0sIGlmIHlvdSBhaW4ndCBxdWljayBhbmQgbmltYmxl",
+        "MDAwMDA1SSBnbyBjcmF6eSB3aGVuIEkgaGVhciBhIGN5bWJhbA==",
+        "MDAwMDA2QW5kIGEgaGlnaCBoYXQgd2l0aCBhIHNvdXBlZCB1cCB0ZW1wbw==",
+        "MDAwMDA3SSdtIG9uIGEgcm9sbCwgaXQncyB0aW1lIHRvIGdvIHNvbG8=",
+        "MDAwMDA4b2xsaW4nIGluIG15IGZpdmUgcG9pbnQgb2g=",
+        "MDAwMDA5aXRoIG15IHJhZy10b3AgZG93biBzbyBteSBoYWlyIGNhbiBibG93",
+    )
+
+    def __init__(self, key: bytes) -> None:
+        self.key = key
+
+    @classmethod
+    def create(cls, key_sz: int = 16) -> CBCPaddingOracle:
+        return cls(key=secrets.token_bytes(key_sz))
+
+    def encrypt(self, plaintext: bytes) -> tuple[bytes, bytes]:
+        """
+        Return a random iv, and plaintext encrypted under it.
+        """
+        iv = secrets.token_bytes(BLK_SZ_BYTES)
+        return iv, cbc_encrypt(pkcs7_pad(plaintext, BLK_SZ_BYTES), self.key, iv)
+
+    def encrypt_random_string(self) -> tuple[bytes, bytes]:
+        return self.encrypt(b64dec(secrets.choice(self.strings)))
+
+    def is_valid_padding(self, iv: bytes, ct: bytes) -> bool:
+        if not ct or len(ct) % BLK_SZ_BYTES:
+            return False
+
+        # only the last block holds padding, and it only needs the block before it
+        prev_ct_blk = ct[-2 * BLK_SZ_BYTES : -BLK_SZ_BYTES] or iv
+        last_pt_blk = cbc_decrypt(ct[-BLK_SZ_BYTES:], self.key, prev_ct_blk)
+        return validate_pkcs7(last_pt_blk, BLK_SZ_BYTES) != 0
+
+
+class PaddingOracleResult:
+    """
+    The plaintext recovered by a padding oracle attack (with its padding removed), and
+    the number of oracle queries each ciphertext block took.
+    """
+
+    def __init__(self, *, plaintext: bytes, block_queries: list[int]) -> None:
+        self.plaintext = plaintext
+        self.block_queries = block_queries
+
+    @property
+    def queries(self) -> int:
+        return sum(self.block_queries)
+
+    def __repr__(self) -> str:
+        return (
+            f"PaddingOracleResult(plaintext={self.plaintext!r}, queries={self.queries})"
+        )
+
+
+# a block is cracked by a generator that yields the forged blocks to send ahead of it,
+# is sent back whether each one made valid padding, and returns the block's plaintext
+# with the number of queries it took. the sync and async attacks only differ in how
+# they get the oracle's answers.
+_BlockPlan = Generator[bytes, bool, tuple[bytes, int]]
+
+
+def _crack_block_plan(prev_ct_blk: bytes, order: bytes, is_last: bool) -> _BlockPlan:
+    """
+    Recover the plaintext of a ciphertext block, which is only ever sent after a forged
+    block in place of prev_ct_blk.
+    """
+    pt = bytearray(BLK_SZ_BYTES)
+    # the block cipher decryption of the block, before it is xor-ed with prev_ct_blk
+    intermediate = bytearray(BLK_SZ_BYTES)
+    forged = bytearray(BLK_SZ_BYTES)
+    queries = 0
+
+    for pad in range(1, BLK_SZ_BYTES + 1):
+        pos = BLK_SZ_BYTES - pad
+        # make the bytes after pos decrypt to the pad value
+        for i in range(pos + 1, BLK_SZ_BYTES):
+            forged[i] = intermediate[i] ^ pad
+
+        guesses = order
+        last_byte = pt[-1]
+        if is_last and pad <= last_byte <= BLK_SZ_BYTES:
+            # still inside the real padding, so the byte is the pad value
+            guesses = bytes([last_byte]) + order.replace(bytes([last_byte]), b"")
+
+        for guess in guesses:
+            # if the plaintext byte is guess, this makes it decrypt to pad
+            forged[pos] = prev_ct_blk[pos] ^ guess ^ pad
+            queries += 1
+            if not (yield bytes(forged)):
+                continue
+
+            if pad == 1:
+                # the padding may have been valid because the bytes before happened to
+                # make a longer pad. changing the byte before pos breaks that, but not
+                # a pad of 1.
+                forged[pos - 1] ^= 0xFF
+                queries += 1
+                still_valid = yield bytes(forged)
+                forged[pos - 1] ^= 0xFF
+                if not still_valid:
+                    continue
+            break
+        else:
+            raise ValueError("The oracle didn't accept any padding for a block.")
+
+        pt[pos] = guess
+        intermediate[pos] = forged[pos] ^ pad
+
+    return bytes(pt), queries
+
+
+def _crack_block(
+    oracle: PaddingOracle,
+    prev_ct_blk: bytes,
+    ct_blk: bytes,
+    order: bytes,
+    is_last: bool,
+) -> tuple[bytes, int]:
+    plan = _crack_block_plan(prev_ct_blk, order, is_last)
+    try:
+        forged = next(plan)
+        while True:
+            forged = plan.send(oracle.is_valid_padding(forged, ct_blk))
+    except StopIteration as stop:
+        cracked: tuple[bytes, int] = stop.value
+        return cracked
+
+
+async def _crack_block_async(
+    oracle: AsyncPaddingOracle,
+    prev_ct_blk: bytes,
+    ct_blk: bytes,
+    order: bytes,
+    is_last: bool,
+) -> tuple[bytes, int]:
+    plan = _crack_block_plan(prev_ct_blk, order, is_last)
+    try:
+        forged = next(plan)
+        while True:
+            forged = plan.send(await oracle.is_valid_padding(forged, ct_blk))
+    except StopIteration as stop:
+        cracked: tuple[bytes, int] = stop.value
+        return cracked
+
+
+def _blocks(iv: bytes, ct: bytes) -> list[tuple[bytes, bytes]]:
+    # each ciphertext block along with the block before it (or the iv)
+    assert ct and len(ct) % BLK_SZ_BYTES == 0
+    assert len(iv) == BLK_SZ_BYTES
+    chained = iv + ct
+    return [
+        (chained[i - BLK_SZ_BYTES : i], chained[i : i + BLK_SZ_BYTES])
+        for i in range(BLK_SZ_BYTES, len(chained), BLK_SZ_BYTES)
+    ]
+
+
+def _result(cracked: list[tuple[bytes, int]]) -> PaddingOracleResult:
+    padded = b"".join(pt for pt, _ in cracked)
+    return PaddingOracleResult(
+        plaintext=pkcs7_unpad(padded, BLK_SZ_BYTES),
+        block_queries=[queries for _, queries in cracked],
+    )
+
+
+async def crack_cbc_padding_oracle_async(
+    oracle: AsyncPaddingOracle,
+    iv: bytes,
+    ct: bytes,
+    *,
+    scorer: Scorer = ENGLISH_SCORER,
+    concurrency: int = 16,
+) -> PaddingOracleResult:
+    """
+    Decrypt ct, encrypted under iv, with nothing but the oracle.
+
+    Each block only depends on the one before it, so blocks are cracked independently,
+    up to concurrency of them at a time. Plaintext bytes are guessed in order of their
+    likelihood under scorer, so text like the scorer's takes far fewer queries than the
+    128 per byte of guessing blindly.
+    """
+    order = scorer.ranked_bytes()
+    blks = _blocks(iv, ct)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def crack(idx: int) -> tuple[bytes, int]:
+        prev_ct_blk, ct_blk = blks[idx]
+        async with semaphore:
+            return await _crack_block_async(
+                oracle, prev_ct_blk, ct_blk, order, idx == len(blks) - 1
+            )
+
+    return _result(await asyncio.gather(*(crack(i) for i in range(len(blks)))))
+
+
+def crack_cbc_padding_oracle(
+    oracle: PaddingOracle,
+    iv: bytes,
+    ct: bytes,
+    *,
+    scorer: Scorer = ENGLISH_SCORER,
+    workers: Optional[int] = 1,
+) -> PaddingOracleResult:
+    """
+    Like crack_cbc_padding_oracle_async, for an oracle that answers right away. With
+    more than 1 worker, the blocks are cracked by a pool of processes, each with its own
+    copy of the oracle (so it has to be picklable).
+    """
+    order = scorer.ranked_bytes()
+    blks = _blocks(iv, ct)
+
+    if workers == 1:
+        return _result(
+            [
+                _crack_block(oracle, prev_ct_blk, ct_blk, order, i == len(blks) - 1)
+                for i, (prev_ct_blk, ct_blk) in enumerate(blks)
+            ]
+        )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _crack_block, oracle, prev_ct_blk, ct_blk, order, i == len(blks) - 1
+            )
+            for i, (prev_ct_blk, ct_blk) in enumerate(blks)
+        ]
+        return _result([future.result() for future in futures])
@@ -0,0 +1,99 @@
+"""
+What the corpus detectors have in common: keeping only the best few candidates out of
+everything scanned, and scanning a corpus in batches with a pool of processes.
+"""
+
+from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+import heapq
+import os
+from collections.abc import Iterable, Iterator
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+# candidates are tuples, best compared greatest. no two candidates may compare equal
+# (e.g. by holding the index of what they were found in), so that the comparison never
+# reaches any fields that aren't comparable.
+C = TypeVar("C", bound=tuple[Any, ...])
+
+
+class TopK(Generic[C]):
+    """
+    The best top_k candidates pushed so far, or all of them if top_k is None. They are
+    kept in heap, a min-heap, which can be sent to another process and merged into a
+    TopK there.
+    """
+
+    def __init__(self, top_k: Optional[int]) -> None:
+        if top_k is not None and top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        self.top_k = top_k
+        self.heap: list[C] = []
+
+    def push(self, candidate: C) -> bool:
+        """
+        Keep candidate if it is one of the top_k so far, and return whether it was.
+        """
+        if self.top_k is None or len(self.heap) < self.top_k:
+            heapq.heappush(self.heap, candidate)
+            return True
+        if candidate > self.heap[0]:
+            heapq.heapreplace(self.heap, candidate)
+            return True
+        return False
+
+    def extend(self, candidates: Iterable[C]) -> None:
+        for candidate in candidates:
+            self.push(candidate)
+
+    def best(self) -> list[C]:
+        """
+        Return the candidates kept, best first.
+        """
+        return sorted(self.heap, reverse=True)
+
+
+def batches(items: Iterable[T], batch_sz: int) -> Iterator[tuple[int, list[T]]]:
+    """
+    Yield lists of batch_sz of items at a time (fewer, for the last one), each with the
+    index of its first item. Items are consumed lazily, a batch at a time.
+    """
+    it = iter(items)
+    start_idx = 0
+    while batch := list(islice(it, batch_sz)):
+        yield start_idx, batch
+        start_idx += len(batch)
+
+
+def scan(
+    f: Callable[..., R], tasks: Iterable[tuple[Any, ...]], workers: Optional[int]
+) -> Iterator[R]:
+    """
+    Yield f(*task) for every task, in no particular order.
+
+    With workers=1, the tasks run in this process. Otherwise, they run in a pool of
+    workers processes (by default, one per cpu) with at most two tasks per worker in
+    flight, so tasks are only consumed as fast as they are done and memory doesn't grow
+    with their number.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            yield f(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight: set[Future[R]] = set()
+        for task in tasks:
+            if len(in_flight) >= 2 * workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            in_flight.add(executor.submit(f, *task))
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
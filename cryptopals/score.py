@@ -1,6 +1,17 @@
+from __future__ import annotations
+import math
 import string
+from collections import Counter
+from collections.abc import Mapping, Sequence
 from functools import total_ordering
 
+try:
+    import numpy as np
+
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
 ENGLISH_LETTER_FREQUENCY = {
     "e": 0.13,
     "t": 0.091,
@@ -31,24 +42,201 @@ ENGLISH_LETTER_FREQUENCY = {
 }
 
 
+SPACE = ord(" ")
+
+STATISTICS = ("weighted", "chi2", "loglik")
+
+_NOT_PRINTABLE_WEIGHT = -0.1
+
+# bytes never seen in a scorer's source text still get a small probability, otherwise a
+# single odd byte would make chi2 and loglik scores infinite
+_MIN_PROBABILITY = 1e-6
+
+_PRINTABLE = string.printable.encode("ascii")
+
+_UPPER = bytes(range(ord("A"), ord("Z") + 1))
+_LOWER = _UPPER.lower()
+
+# maps each byte to its lowercase counterpart (ascii only, like bytes.lower)
+_FOLD_CASE = bytes(range(256)).lower()
+
+# breaks ties between bytes of equal probability in Scorer.ranked_bytes
+_COMMON_PUNCTUATION = b" .,'\n\"-!?;:()"
+
+if HAVE_NUMPY:
+    _UPPER_IDXS = np.frombuffer(_UPPER, dtype=np.uint8)
+    _LOWER_IDXS = np.frombuffer(_LOWER, dtype=np.uint8)
+
+
+class Scorer:
+    """
+    Scores bytes for how much they look like the text that the scorer was built from.
+    Higher scores are better for every statistic:
+
+    - "weighted": kinda an arbitrary scorer for finding english text. each byte adds its
+      frequency to the score, or a penalty if it never occurs and isn't printable. then
+      the score is multiplied by the number of spaces (i.e. word delimiters) + 1.
+    - "chi2": the negated chi-squared statistic of the byte counts against the counts
+      expected from the frequencies.
+    - "loglik": the average log-likelihood of a byte under the frequencies.
+
+    frequencies has an entry for each of the 256 byte values. With fold_case, uppercase
+    letters are counted as lowercase ones (so only the lowercase frequencies matter).
+
+    Everything is precomputed into 256-entry tables when the scorer is built, so that
+    scoring is a single pass to count the bytes plus one lookup per distinct byte.
+    """
+
+    def __init__(
+        self,
+        frequencies: Sequence[float],
+        *,
+        statistic: str = "weighted",
+        fold_case: bool = False,
+    ) -> None:
+        if len(frequencies) != 256:
+            raise ValueError("frequencies must have 256 entries")
+        if statistic not in STATISTICS:
+            raise ValueError(f"statistic must be one of {STATISTICS}")
+
+        self.statistic = statistic
+        self.fold_case = fold_case
+
+        self.weights = tuple(
+            (
+                float(freq)
+                if freq > 0
+                else (0.0 if byte in _PRINTABLE else _NOT_PRINTABLE_WEIGHT)
+            )
+            for byte, freq in enumerate(frequencies)
+        )
+
+        floored = [max(float(freq), 0.0) + _MIN_PROBABILITY for freq in frequencies]
+        total = sum(floored)
+        self.probabilities = tuple(freq / total for freq in floored)
+        self.log_probabilities = tuple(math.log(p) for p in self.probabilities)
+
+        if HAVE_NUMPY:
+            self._np_weights = np.array(self.weights)
+            self._np_probabilities = np.array(self.probabilities)
+            self._np_log_probabilities = np.array(self.log_probabilities)
+
+    @classmethod
+    def from_corpus(
+        cls, corpus: bytes, *, statistic: str = "weighted", fold_case: bool = False
+    ) -> Scorer:
+        """
+        Build a scorer from the byte frequencies of some sample text.
+        """
+        counts = Counter(corpus.lower() if fold_case else corpus)
+        total = len(corpus) or 1
+        return cls(
+            [counts[byte] / total for byte in range(256)],
+            statistic=statistic,
+            fold_case=fold_case,
+        )
+
+    @classmethod
+    def from_letter_frequencies(
+        cls, frequencies: Mapping[str, float], *, statistic: str = "weighted"
+    ) -> Scorer:
+        """
+        Build a case-insensitive scorer from a table of (lowercase) character
+        frequencies, like ENGLISH_LETTER_FREQUENCY.
+        """
+        table = [0.0] * 256
+        for char, freq in frequencies.items():
+            table[ord(char)] = freq
+        return cls(table, statistic=statistic, fold_case=True)
+
+    def score(self, s: bytes) -> float:
+        return self._score_counts(Counter(s.lower() if self.fold_case else s))
+
+    def score_counts(self, counts: Mapping[int, int]) -> float:
+        """
+        Score bytes from how many times each byte value occurs in them. Byte values that
+        don't occur can be left out.
+        """
+        if self.fold_case:
+            folded: Counter[int] = Counter()
+            for byte, count in counts.items():
+                folded[_FOLD_CASE[byte]] += count
+            counts = folded
+        return self._score_counts(counts)
+
+    def _score_counts(self, counts: Mapping[int, int]) -> float:
+        if self.statistic == "weighted":
+            total = sum(count * self.weights[byte] for byte, count in counts.items())
+            return total * (counts.get(SPACE, 0) + 1)
+
+        n = sum(counts.values())
+        if n == 0:
+            return 0.0
+
+        if self.statistic == "chi2":
+            # sum((count - expected) ** 2 / expected) over all 256 byte values, where
+            # expected = n * p, simplifies to sum(count ** 2 / expected) - n. so only
+            # the byte values that occur are needed.
+            probs = self.probabilities
+            return n - sum(
+                count * count / (n * probs[byte]) for byte, count in counts.items()
+            )
+
+        log_probs = self.log_probabilities
+        return sum(count * log_probs[byte] for byte, count in counts.items()) / n
+
+    def ranked_bytes(self) -> bytes:
+        """
+        All 256 byte values, most likely first. Ties (e.g. between the many bytes that
+        the scorer has never seen) go to printable bytes, then to common punctuation.
+        """
+
+        def likelihood(byte: int) -> tuple[float, bool, int]:
+            folded = _FOLD_CASE[byte] if self.fold_case else byte
+            # uppercase letters share their lowercase letter's probability when case is
+            # folded, but are much rarer
+            p = self.probabilities[folded] * (1.0 if folded == byte else 0.1)
+            if byte == SPACE and self.statistic == "weighted":
+                # the weighted statistic values spaces above everything else
+                p = 1.0
+            common = _COMMON_PUNCTUATION.find(byte)
+            return (p, byte in _PRINTABLE, -common if common >= 0 else -256)
+
+        ranked: list[int] = sorted(range(256), key=likelihood, reverse=True)
+        return bytes(ranked)
+
+    def score_histograms(self, hists: np.ndarray) -> np.ndarray:
+        """
+        Score many byte histograms at once. hists is a numpy array with 256 columns,
+        where each row holds the counts of the byte values in some bytes. Needs numpy.
+        """
+        hists = np.asarray(hists, dtype=np.float64)
+        if self.fold_case:
+            hists = hists.copy()
+            hists[:, _LOWER_IDXS] += hists[:, _UPPER_IDXS]
+            hists[:, _UPPER_IDXS] = 0
+
+        if self.statistic == "weighted":
+            result: np.ndarray = (hists @ self._np_weights) * (hists[:, SPACE] + 1)
+            return result
+
+        n = hists.sum(axis=1)
+        # empty rows score 0, like in score_counts
+        nonzero_n = np.maximum(n, 1)
+
+        if self.statistic == "chi2":
+            result = n - (hists * hists) @ (1 / self._np_probabilities) / nonzero_n
+            return result
+
+        result = (hists @ self._np_log_probabilities) / nonzero_n
+        return result
+
+
+ENGLISH_SCORER = Scorer.from_letter_frequencies(ENGLISH_LETTER_FREQUENCY)
+
+
 def score_bytes_for_english(s: bytes) -> float:
-    # kinda an arbitrary scorer for finding english text
-    # letter frequency is taken into account, where more frequently letters improve the
-    # score
-    # if the letter is not printable, the score is reduced
-    # if the bytes contain spaces (i.e. word delimiters), the score is improved
-    total = 0.0
-
-    for c in s:
-        char = chr(c).lower()
-        if char in ENGLISH_LETTER_FREQUENCY:
-            total += ENGLISH_LETTER_FREQUENCY[char]
-        elif char not in string.printable:
-            total += -0.1
-
-    total *= s.count(b" ") + 1
-
-    return total
+    return ENGLISH_SCORER.score(s)
 
 
 @total_ordering
@@ -1,13 +1,87 @@
-from itertools import cycle, combinations
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import heapq
 import math
-from statistics import mean
+from statistics import mean, pstdev
+from collections import Counter
 from collections.abc import Iterable
+from typing import Optional, Union
 
-from cryptopals.hamming import hamming_distance
-from cryptopals.score import ScoreResult, score_bytes_for_english
+from cryptopals.scan import TopK, batches, scan
+from cryptopals.score import ENGLISH_SCORER, Scorer, ScoreResult
 
+try:
+    import numpy as np
 
-def repeating_key_xor(s: bytes, key: bytes) -> bytes:
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+if HAVE_NUMPY:
+    # _KEYED_BYTES[key, b] is the ciphertext byte that decrypts to b under key
+    _KEYED_BYTES = np.arange(256)[:, None] ^ np.arange(256)[None, :]
+
+
+BytesLike = Union[bytes, bytearray, memoryview]
+WritableBuffer = Union[bytearray, memoryview]
+
+# bytes xor-ed at a time, so that the tiled key (and any temporaries) stay small no
+# matter how long the input is
+_XOR_CHUNK_SZ = 1 << 20
+
+
+def _tiled_key(key: BytesLike, sz: int, phase: int) -> bytes:
+    # key repeated to sz bytes, starting from key[phase]
+    key = bytes(key)
+    rotated = key[phase:] + key[:phase]
+    return (rotated * (sz // len(rotated) + 1))[:sz]
+
+
+def repeating_key_xor_into(
+    s: BytesLike, key: BytesLike, out: WritableBuffer, phase: int = 0
+) -> int:
+    """
+    Like repeating_key_xor, writing the result into out (which may be s itself, for an
+    in-place xor) and returning the number of bytes written. phase is the index of the
+    key byte that s[0] is xor-ed with. Raises ValueError for an empty key.
+    """
+    if not key:
+        raise ValueError("key must not be empty")
+    n = len(s)
+    if len(out) < n:
+        raise ValueError(f"Output buffer must hold at least {n} bytes.")
+
+    src = memoryview(s).cast("B")
+    dst = memoryview(out).cast("B")
+
+    # every chunk but the last is a multiple of the key length, so the same tiled key
+    # lines up with each of them
+    chunk_sz = max(_XOR_CHUNK_SZ - _XOR_CHUNK_SZ % len(key), len(key))
+    tiled = _tiled_key(key, min(chunk_sz, n), phase % len(key))
+
+    if HAVE_NUMPY:
+        tiled_arr = np.frombuffer(tiled, dtype=np.uint8)
+        for start in range(0, n, chunk_sz):
+            chunk = np.frombuffer(src[start : start + chunk_sz], dtype=np.uint8)
+            np.bitwise_xor(
+                chunk,
+                tiled_arr[: len(chunk)],
+                out=np.frombuffer(dst[start : start + len(chunk)], dtype=np.uint8),
+            )
+        return n
+
+    # without numpy, xor a chunk at a time as big integers
+    for start in range(0, n, chunk_sz):
+        piece = src[start : start + chunk_sz]
+        sz = len(piece)
+        dst[start : start + sz] = (
+            int.from_bytes(piece, "big") ^ int.from_bytes(tiled[:sz], "big")
+        ).to_bytes(sz, "big")
+    return n
+
+
+def repeating_key_xor(s: BytesLike, key: BytesLike) -> bytes:
     # encrypt bytes in s by xor-ing them with the bytes in key. bytes from key are
     # applied cyclically to s. so, with a plaintext "Hello, there!" and key "ICE", the
     # xoring is done in the following way:
@@ -16,99 +90,424 @@ def repeating_key_xor(s: bytes, key: bytes) -> bytes:
     #  ^ ICEICEICEICEI
     #  ---------------
     #      <result>
-    out = []
-
-    for c, k in zip(s, cycle(key)):
-        out.append(c ^ k)
+    if len(key) == 1:
+        return single_byte_xor(s, key[0])
 
+    out = bytearray(len(s))
+    repeating_key_xor_into(s, key, out)
     return bytes(out)
 
 
-def xor_bytes(a: bytes, b: bytes) -> bytes:
+class RepeatingKeyXor:
+    """
+    Repeating key xor of a stream that comes in chunks of any size, keeping track of
+    which key byte the next chunk starts at.
+    """
+
+    def __init__(self, key: BytesLike) -> None:
+        if not key:
+            raise ValueError("key must not be empty")
+        self.key = bytes(key)
+        self.phase = 0
+
+    def update_into(self, chunk: BytesLike, out: WritableBuffer) -> int:
+        n = repeating_key_xor_into(chunk, self.key, out, self.phase)
+        self.phase = (self.phase + n) % len(self.key)
+        return n
+
+    def update(self, chunk: BytesLike) -> bytes:
+        out = bytearray(len(chunk))
+        self.update_into(chunk, out)
+        return bytes(out)
+
+
+def xor_bytes(a: BytesLike, b: BytesLike) -> bytes:
     # this is just a special case of repeating key xor where the "key" is only cycled
-    # through one time
+    # through one time, so the whole thing is a single big integer xor
     assert len(a) == len(b)
-    return repeating_key_xor(a, b)
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(len(a), "big")
 
 
-def single_byte_xor(s: bytes, key: int) -> bytes:
+def single_byte_xor(s: BytesLike, key: int) -> bytes:
     # encrypt bytes in s by xor-ing them with key
-    # yet another special case of repeating key xor where key has length == 1
-    return repeating_key_xor(s, bytes([key]))
+    # yet another special case of repeating key xor where key has length == 1, which
+    # maps every byte through the same table
+    return bytes(s).translate(_single_byte_xor_table(key))
+
+
+@lru_cache(maxsize=256)
+def _single_byte_xor_table(key: int) -> bytes:
+    return bytes(b ^ key for b in range(256))
+
+
+def single_byte_xor_scores(s: bytes, scorer: Scorer = ENGLISH_SCORER) -> list[float]:
+    """
+    Return the score of single_byte_xor(s, key) for every key from 0 to 255, without
+    building any of the plaintexts.
+
+    Scores only depend on how many times each byte value occurs, and xor-ing with a key
+    just moves the counts of a histogram around: the plaintext under key has as many b
+    bytes as s has b ^ key bytes. So s is counted once, and every key is scored from the
+    256 counts, no matter how long s is.
+    """
+    if HAVE_NUMPY:
+        hist = np.bincount(np.frombuffer(s, dtype=np.uint8), minlength=256)
+        # row key is the histogram of the plaintext under key
+        keyed_hists = hist[_KEYED_BYTES]
+        return list(scorer.score_histograms(keyed_hists).tolist())
 
+    counts = Counter(s)
+    return [
+        scorer.score_counts({c ^ key: n for c, n in counts.items()})
+        for key in range(256)
+    ]
 
-def score_single_byte_xor_keys(s: bytes) -> Iterable[ScoreResult]:
-    results = []
-    for key in range(256):
-        msg = single_byte_xor(s, key)
-        score = score_bytes_for_english(msg)
-        result = ScoreResult(score=score, msg=msg, key=bytes([key]))
-        results.append(result)
 
-    yield from sorted(results, reverse=True)
+def best_single_byte_xor_keys(
+    s: bytes, top_k: int = 1, scorer: Scorer = ENGLISH_SCORER
+) -> list[ScoreResult]:
+    """
+    Return the top_k best scoring single byte xor keys for s, best first. Only the
+    plaintexts of those keys are built.
+    """
+    scores = single_byte_xor_scores(s, scorer)
+    # ties keep key order, the same as a stable sort of all keys would
+    best_keys = heapq.nlargest(top_k, range(256), key=scores.__getitem__)
+    return [
+        ScoreResult(score=scores[key], msg=single_byte_xor(s, key), key=bytes([key]))
+        for key in best_keys
+    ]
 
 
-def find_repeating_xor_key(s: bytes) -> bytes:
-    best_key_sz = _key_szs_ranked(s)[0]
+def score_single_byte_xor_keys(
+    s: bytes, scorer: Scorer = ENGLISH_SCORER
+) -> Iterable[ScoreResult]:
+    # plaintexts are built lazily, as the results are consumed
+    scores = single_byte_xor_scores(s, scorer)
+    for key in sorted(range(256), key=scores.__getitem__, reverse=True):
+        yield ScoreResult(
+            score=scores[key], msg=single_byte_xor(s, key), key=bytes([key])
+        )
+
+
+class DetectionResult(ScoreResult):
+    def __init__(self, *, score: float, msg: bytes, key: bytes, idx: int):
+        super().__init__(score=score, msg=msg, key=key)
+        self.idx = idx
+
+
+# (score, -idx, -key, ciphertext). negating idx and key makes earlier lines and keys win
+# ties, like a stable sort would.
+_Candidate = tuple[float, int, int, bytes]
+
+
+def _detect_batch(
+    start_idx: int, cts: list[bytes], top_k: int, scorer: Scorer
+) -> list[_Candidate]:
+    best: TopK[_Candidate] = TopK(top_k)
+
+    for idx, ct in enumerate(cts, start_idx):
+        scores = single_byte_xor_scores(ct, scorer)
+        for key in heapq.nlargest(top_k, range(256), key=scores.__getitem__):
+            if not best.push((scores[key], -idx, -key, ct)):
+                # the rest of this line's keys score even lower
+                break
+
+    return best.heap
+
+
+def detect_single_byte_xor(
+    lines_iter: Iterable[bytes],
+    top_k: int = 1,
+    workers: Optional[int] = None,
+    batch_sz: int = 1024,
+    scorer: Scorer = ENGLISH_SCORER,
+) -> list[DetectionResult]:
+    """
+    Return the top_k (line, key) pairs, best first, of all the ciphertexts in lines_iter
+    decrypted under every single byte xor key. The idx of each result is the position of
+    its line in lines_iter.
 
-    key_bytes = []
+    Lines are consumed lazily in batches of batch_sz, which are scored by a pool of
+    workers processes (by default, one per cpu). Each batch only sends back its top_k
+    candidates, and only a few batches per worker are in flight at once, so memory does
+    not grow with the number of lines. With workers=1, everything runs in this process.
+    """
+    best: TopK[_Candidate] = TopK(top_k)
+    tasks = (
+        (start_idx, batch, top_k, scorer)
+        for start_idx, batch in batches(lines_iter, batch_sz)
+    )
+    for candidates in scan(_detect_batch, tasks, workers):
+        best.extend(candidates)
 
-    for idx in range(best_key_sz):
-        nth_bytes_from_blks = _nth_bytes_of_blks(s, best_key_sz, idx)
-        best_result = next(
-            iter(score_single_byte_xor_keys(b"".join(nth_bytes_from_blks)))
+    return [
+        DetectionResult(
+            score=score,
+            msg=single_byte_xor(ct, -neg_key),
+            key=bytes([-neg_key]),
+            idx=-neg_idx,
         )
-        key_bytes.append(best_result.key)
+        for score, neg_idx, neg_key, ct in best.best()
+    ]
+
+
+def find_repeating_xor_key(
+    s: bytes,
+    *,
+    key_sz: Optional[int] = None,
+    workers: int = 1,
+    scorer: Scorer = ENGLISH_SCORER,
+) -> bytes:
+    return find_repeating_xor_keys(s, 1, key_sz=key_sz, workers=workers, scorer=scorer)[
+        0
+    ]
+
+
+def find_repeating_xor_keys(
+    s: bytes,
+    top_n: int,
+    *,
+    key_sz: Optional[int] = None,
+    workers: int = 1,
+    scorer: Scorer = ENGLISH_SCORER,
+) -> list[bytes]:
+    """
+    Return the top_n most probable keys that s was repeating-xor-encrypted with, best
+    first. The key size is the best one from rank_key_sizes, unless key_sz is given.
+
+    Byte j of the key is the single byte xor key of column j, i.e. of s[j::key_sz].
+    Columns are solved independently (by a pool of workers processes, if more than 1),
+    keeping the top_n candidates of each. Keys are then ranked by the sum of their
+    bytes' scores, so that when a column is ambiguous, the keys using its runner-up
+    bytes come next.
+    """
+    if key_sz is None:
+        key_sz = rank_key_sizes(s, workers=workers)[0].key_sz
+
+    if workers == 1:
+        columns = [_solve_column(s[j::key_sz], top_n, scorer) for j in range(key_sz)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_set_worker_input, initargs=(s,)
+        ) as executor:
+            columns = list(
+                executor.map(
+                    _solve_column_of_worker_input,
+                    range(key_sz),
+                    [key_sz] * key_sz,
+                    [top_n] * key_sz,
+                    [scorer] * key_sz,
+                )
+            )
+
+    return [bytes(key) for key in _best_combinations(columns, top_n)]
+
+
+def _solve_column(col: bytes, top_n: int, scorer: Scorer) -> list[tuple[float, int]]:
+    """
+    Return the top_n (score, key) single byte xor keys for col, best first.
+    """
+    scores = single_byte_xor_scores(col, scorer)
+    return [
+        (scores[key], key)
+        for key in heapq.nlargest(top_n, range(256), key=scores.__getitem__)
+    ]
+
+
+def _best_combinations(
+    columns: list[list[tuple[float, int]]], top_n: int
+) -> list[list[int]]:
+    """
+    Given the candidates of each column, best first, return the top_n combinations of
+    one candidate per column, by the sum of their scores.
+    """
+
+    # best-first search over the choice of candidate in each column. the best
+    # combination takes the first candidate everywhere, and every other combination is
+    # one step down in a single column from a better one.
+    def total(choice: tuple[int, ...]) -> float:
+        return sum(column[idx][0] for column, idx in zip(columns, choice))
+
+    start = (0,) * len(columns)
+    heap = [(-total(start), start)]
+    seen = {start}
+    best: list[list[int]] = []
+
+    while heap and len(best) < top_n:
+        _, choice = heapq.heappop(heap)
+        best.append([column[idx][1] for column, idx in zip(columns, choice)])
+
+        for col_idx, column in enumerate(columns):
+            if choice[col_idx] + 1 < len(column):
+                step = choice[:col_idx] + (choice[col_idx] + 1,) + choice[col_idx + 1 :]
+                if step not in seen:
+                    seen.add(step)
+                    heapq.heappush(heap, (-total(step), step))
 
-    return b"".join(key_bytes)
+    return best
 
 
-def _key_szs_ranked(
-    s: bytes, sz_low: int = 2, sz_hi: int = 40, compares: int = 16
-) -> list[int]:
+def _solve_column_of_worker_input(
+    col_idx: int, key_sz: int, top_n: int, scorer: Scorer
+) -> list[tuple[float, int]]:
+    return _solve_column(_worker_input[col_idx::key_sz], top_n, scorer)
+
+
+KEY_SZ_METHODS = ("hamming", "ioc")
+
+# bytes of s counted at a time by the numpy column histograms
+_HIST_CHUNK_BYTES = 1 << 22
+
+# _WITH_BIT[b] holds every byte value that has bit b set
+_WITH_BIT = [bytes(v for v in range(256) if v >> b & 1) for b in range(8)]
+
+if HAVE_NUMPY:
+    # _BITS[v, b] is bit b of byte value v
+    _BITS = (np.arange(256)[:, None] >> np.arange(8)[None, :]) & 1
+
+
+class KeySizeResult:
+    def __init__(self, *, key_sz: int, score: float, confidence: float) -> None:
+        self.key_sz = key_sz
+        self.score = score
+        self.confidence = confidence
+
+
+def rank_key_sizes(
+    s: bytes,
+    sz_low: int = 2,
+    sz_hi: int = 40,
+    *,
+    method: str = "hamming",
+    max_blks: Optional[int] = None,
+    workers: int = 1,
+) -> list[KeySizeResult]:
     """
     Return in decreasing order the most probable size of a key that has been used to
     repeating-xor-encrypt the english-language data in the bytes of s.
 
-    The most probable key size for these contents is the one with the smallest hamming
-    distance between arbitrary blocks of that size in s. The number of distances taken
-    is specified by the compares parameter. It's possible that more comparisons than
-    possible is specified, in which case this function will raise a ValueError.
+    Key sizes from sz_low to sz_hi (inclusive) will be considered. s is cut into blocks
+    of each key size, and the key size is scored by one of these methods:
 
-    Key sizes from sz_low to sz_hi (inclusive) will be considered.
+    - "hamming": the average hamming distance between every pair of blocks, normalized
+      by the key size. the smallest distance is the most probable.
+    - "ioc": the index of coincidence of the columns of the blocks, i.e. the chance that
+      two bytes at the same position in two blocks are equal. the largest is the most
+      probable. multiples of the key size score about as well as the key size itself.
+
+    Both are computed from how often each byte value occurs in each column, instead of
+    from the pairs themselves, so every pair of blocks counts at the cost of a pass over
+    s. Only the first max_blks blocks are used, if given. Key sizes that don't fit in s
+    twice are skipped, and key sizes are scored by a pool of workers processes.
+
+    The confidence of a result is how many standard deviations its score is better than
+    the mean score of all the key sizes.
     """
-    key_szs = []
+    if method not in KEY_SZ_METHODS:
+        raise ValueError(f"method must be one of {KEY_SZ_METHODS}")
+    if max_blks is not None and max_blks < 2:
+        raise ValueError("max_blks must be at least 2, to make a pair of blocks")
 
-    for key_sz in range(sz_low, sz_hi + 1):
-        n_blocks = len(s) // key_sz
+    key_szs = [sz for sz in range(sz_low, sz_hi + 1) if len(s) // sz >= 2]
+    if not key_szs:
+        raise ValueError(f"Need at least 2 blocks of {sz_low} bytes")
 
-        if math.comb(n_blocks, 2) < compares:
-            raise ValueError(
-                f"Can't make {compares} comparisons with {n_blocks} blocks"
+    if workers == 1:
+        scores = [_key_sz_score(s, sz, method, max_blks) for sz in key_szs]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_set_worker_input, initargs=(s,)
+        ) as executor:
+            scores = list(
+                executor.map(
+                    _key_sz_score_of_worker_input,
+                    key_szs,
+                    [method] * len(key_szs),
+                    [max_blks] * len(key_szs),
+                )
             )
 
-        norm_dists = []
-        blk_combs = combinations(range(n_blocks), 2)
-        for _ in range(compares):
-            blk_a_idx, blk_b_idx = next(blk_combs)
+    # make higher better for both methods
+    signed = [-score if method == "hamming" else score for score in scores]
+    mean_score = mean(signed)
+    stdev = pstdev(signed) or 1.0
+
+    results = [
+        KeySizeResult(key_sz=sz, score=score, confidence=(sign - mean_score) / stdev)
+        for sz, score, sign in zip(key_szs, scores, signed)
+    ]
+    results.sort(key=lambda result: result.confidence, reverse=True)
 
-            blk_a = s[key_sz * blk_a_idx : key_sz * blk_a_idx + key_sz]
-            blk_b = s[key_sz * blk_b_idx : key_sz * blk_b_idx + key_sz]
+    return results
 
-            norm_dist = hamming_distance(blk_a, blk_b) / key_sz
-            norm_dists.append(norm_dist)
 
-        avg_norm_dist = mean(norm_dists)
+_worker_input = b""
 
-        key_szs.append((avg_norm_dist, key_sz))
 
-    return [key_sz for _, key_sz in sorted(key_szs)]
+def _set_worker_input(s: bytes) -> None:
+    # sent to each worker process once, instead of once per task
+    global _worker_input
+    _worker_input = s
+
+
+def _key_sz_score_of_worker_input(
+    key_sz: int, method: str, max_blks: Optional[int]
+) -> float:
+    return _key_sz_score(_worker_input, key_sz, method, max_blks)
+
+
+def _key_sz_score(s: bytes, key_sz: int, method: str, max_blks: Optional[int]) -> float:
+    n_blks = len(s) // key_sz
+    if max_blks is not None:
+        n_blks = min(n_blks, max_blks)
+    # rank_key_sizes only asks for key sizes with a pair of blocks to compare
+    assert n_blks >= 2
+    data = s[: n_blks * key_sz]
+
+    # summed over every pair of blocks, a bit of a column differs once for each pair
+    # where only one of the blocks has it set: (blocks with it) * (blocks without it)
+    # times. and a column has equal bytes once for each pair of blocks with the same
+    # byte value there.
+    if HAVE_NUMPY:
+        hist = _column_hists(data, key_sz)
+        if method == "hamming":
+            ones = hist @ _BITS
+            diffs = int((ones * (n_blks - ones)).sum())
+        else:
+            coincidences = int((hist * (hist - 1)).sum())
+    else:
+        cols = [data[j::key_sz] for j in range(key_sz)]
+        if method == "hamming":
+            diffs = 0
+            for col in cols:
+                for with_bit in _WITH_BIT:
+                    ones = n_blks - len(col.translate(None, with_bit))
+                    diffs += ones * (n_blks - ones)
+        else:
+            coincidences = sum(
+                count * (count - 1) for col in cols for count in Counter(col).values()
+            )
+
+    pairs = math.comb(n_blks, 2)
+    if method == "hamming":
+        return diffs / pairs / key_sz
+    return coincidences / 2 / pairs / key_sz
+
+
+def _column_hists(data: bytes, key_sz: int) -> np.ndarray:
+    """
+    Return an array where row j holds the counts of each byte value in column j of data
+    (i.e. in data[j::key_sz]).
+    """
+    mat = np.frombuffer(data, dtype=np.uint8).reshape(-1, key_sz)
+    # give each column its own 256 bins, so that one bincount counts all of them
+    offsets = np.arange(key_sz) * 256
+    hist = np.zeros(key_sz * 256, dtype=np.int64)
 
+    rows_per_chunk = max(1, _HIST_CHUNK_BYTES // key_sz)
+    for start in range(0, len(mat), rows_per_chunk):
+        binned = mat[start : start + rows_per_chunk] + offsets
+        hist += np.bincount(binned.ravel(), minlength=key_sz * 256)
 
-def _nth_bytes_of_blks(s: bytes, blk_sz: int, n: int) -> list[bytes]:
-    out = []
-    for chunk_start in range(0, len(s), blk_sz):
-        idx = chunk_start + n
-        if idx < len(s):
-            out.append(bytes([s[idx]]))
-    return out
+    return hist.reshape(key_sz, 256)
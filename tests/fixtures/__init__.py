@@ -1,5 +1,7 @@
 from pathlib import Path
 
+from cryptopals.bintext import b64dec_stream
+from cryptopals.corpus import LineCorpus
 
 FIXTURE_ROOT = Path(__file__).parent
 
@@ -20,3 +22,15 @@ def data_file_contents(file_name: str) -> str:
 
     with path.open("r") as data_file:
         return "".join(line.strip() for line in data_file)
+
+
+def data_file_b64dec(file_name: str) -> bytes:
+    path = data_file_path(file_name)
+
+    with path.open("rb") as data_file:
+        return b"".join(b64dec_stream(data_file))
+
+
+def data_file_corpus(file_name: str) -> LineCorpus:
+    # caching the index would write files into the fixtures
+    return LineCorpus(data_file_path(file_name), cache_index=False)
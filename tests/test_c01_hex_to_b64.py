@@ -1,4 +1,17 @@
-from cryptopals.bintext import b16dec, b64enc
+import pytest
+
+from cryptopals.bintext import (
+    B64Decoder,
+    B64Encoder,
+    b16dec,
+    b16dec_into,
+    b16dec_stream,
+    b16enc,
+    b64dec,
+    b64dec_into,
+    b64dec_stream,
+    b64enc,
+)
 
 
 def test_challenge() -> None:
@@ -11,3 +24,52 @@ def test_challenge() -> None:
     actual = b64enc(b16dec(input_str))
 
     assert expected == actual
+
+
+def test_round_trip() -> None:
+    for n in range(10):
+        data = bytes(range(256 - n))
+
+        assert b64dec(b64enc(data)) == data
+        assert b16dec(b16enc(data).lower()) == data
+
+
+def test_dec_into() -> None:
+    out = bytearray(8)
+
+    assert b64dec_into(memoryview(b"SSdt"), out) == 3
+    assert b16dec_into(b"49276d", memoryview(out)[3:]) == 3
+    assert out == b"I'mI'm\x00\x00"
+
+
+def test_invalid() -> None:
+    for s, msg in [
+        ("SSd", "length divisible by 4"),
+        ("SS!t", "Illegal character"),
+        ("S=dt", "padding character in middle"),
+        ("S===", "Illegal number of padding"),
+    ]:
+        with pytest.raises(ValueError, match=msg):
+            b64dec(s)
+
+    with pytest.raises(ValueError, match="Illegal character"):
+        b16dec("4G")
+
+
+def test_streaming() -> None:
+    data = bytes(range(256)) * 3
+    encoded = b64enc(data)
+    lines = [encoded[i : i + 7] + "\n" for i in range(0, len(encoded), 7)]
+
+    assert b"".join(b64dec_stream(lines)) == data
+    assert b"".join(b16dec_stream([b16enc(data[:5]), b16enc(data[5:])])) == data
+
+    encoder = B64Encoder()
+    chunks = [encoder.update(data[i : i + 5]) for i in range(0, len(data), 5)]
+
+    assert "".join(chunks) + encoder.finalize() == encoded
+
+    decoder = B64Decoder()
+    decoder.update("SSd")
+    with pytest.raises(ValueError, match="length divisible by 4"):
+        decoder.finalize()
@@ -1,5 +1,14 @@
+import pytest
+
+from cryptopals import xor
 from cryptopals.bintext import b16dec
-from cryptopals.xor import score_single_byte_xor_keys
+from cryptopals.score import STATISTICS, Scorer, score_bytes_for_english
+from cryptopals.xor import (
+    best_single_byte_xor_keys,
+    score_single_byte_xor_keys,
+    single_byte_xor,
+    single_byte_xor_scores,
+)
 
 
 def test_challenge() -> None:
@@ -11,3 +20,57 @@ def test_challenge() -> None:
     # i solved the challenge before writing the test.
     assert best.msg == b"Cooking MC's like a pound of bacon"
     assert best.key == b"X"
+
+
+@pytest.mark.parametrize("have_numpy", [True, False])
+def test_scores_match_plaintext_scores(
+    monkeypatch: pytest.MonkeyPatch, have_numpy: bool
+) -> None:
+    if have_numpy and not xor.HAVE_NUMPY:
+        pytest.skip("numpy is not installed")
+    monkeypatch.setattr(xor, "HAVE_NUMPY", have_numpy)
+
+    ct = bytes(range(256)) + b"Cooking MC's like a pound of bacon"
+
+    scores = single_byte_xor_scores(ct)
+
+    for key in range(256):
+        expected = score_bytes_for_english(single_byte_xor(ct, key))
+        assert scores[key] == pytest.approx(expected)
+
+    top = best_single_byte_xor_keys(ct, top_k=3)
+    assert [r.key for r in top] == [r.key for r in score_single_byte_xor_keys(ct)][:3]
+
+
+CORPUS = (
+    b"It is a truth universally acknowledged, that a single man in possession of a "
+    b"good fortune, must be in want of a wife. However little known the feelings or "
+    b"views of such a man may be on his first entering a neighbourhood, this truth is "
+    b"so well fixed in the minds of the surrounding families, that he is considered "
+    b"the rightful property of some one or other of their daughters."
+)
+
+
+@pytest.mark.parametrize("statistic", STATISTICS)
+def test_corpus_scorer(statistic: str) -> None:
+    ct = b16dec("1b37373331363f78151b7f2b783431333d78397828372d363c78373e783a393b3736")
+    scorer = Scorer.from_corpus(CORPUS, statistic=statistic, fold_case=True)
+
+    best = best_single_byte_xor_keys(ct, scorer=scorer)[0]
+
+    assert best.msg == b"Cooking MC's like a pound of bacon"
+
+
+@pytest.mark.parametrize("statistic", STATISTICS)
+def test_scorer_histograms_match_counts(statistic: str) -> None:
+    if not xor.HAVE_NUMPY:
+        pytest.skip("numpy is not installed")
+    import numpy as np
+
+    scorer = Scorer.from_corpus(CORPUS, statistic=statistic, fold_case=True)
+    samples = [b"", b"Hello, World!", bytes(range(256)), CORPUS]
+    hists = np.array([[s.count(bytes([b])) for b in range(256)] for s in samples])
+
+    assert scorer.score_histograms(hists).tolist() == pytest.approx(
+        [scorer.score(s) for s in samples]
+    )
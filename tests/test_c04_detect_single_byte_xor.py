@@ -1,17 +1,15 @@
+import pytest
+
 from cryptopals.bintext import b16dec
-from cryptopals.xor import score_single_byte_xor_keys
-from tests.fixtures import data_file_lines
+from cryptopals.xor import detect_single_byte_xor
+from tests.fixtures import data_file_corpus, data_file_lines
 
 
 def test_challenge() -> None:
-    cts = [
-        b16dec(line.strip())
-        for line in data_file_lines("c04_detect_single_byte_xor.txt")
-    ]
+    cts = (b16dec(line) for line in data_file_corpus("c04_detect_single_byte_xor.txt"))
 
-    results = [result for ct in cts for result in score_single_byte_xor_keys(ct)]
-
-    results.sort(reverse=True)
+    # small batches so that the work is spread over both workers
+    results = detect_single_byte_xor(cts, top_k=3, workers=2, batch_sz=64)
 
     best = results[0]
 
@@ -19,3 +17,23 @@ def test_challenge() -> None:
     # i solved the challenge before writing the test.
     assert best.msg == b"Now that the party is jumping\n"
     assert best.key == b"5"
+    assert best.idx == 170
+
+    assert len(results) == 3
+    assert results == sorted(results, reverse=True)
+    assert [(r.idx, r.key) for r in results] == [
+        (r.idx, r.key)
+        for r in detect_single_byte_xor(
+            (
+                b16dec(line)
+                for line in data_file_lines("c04_detect_single_byte_xor.txt")
+            ),
+            top_k=3,
+            workers=1,
+        )
+    ]
+
+
+def test_top_k() -> None:
+    with pytest.raises(ValueError):
+        detect_single_byte_xor([b"abc"], top_k=0)
@@ -1,5 +1,11 @@
+from itertools import cycle
+import os
+
+import pytest
+
+from cryptopals import xor
 from cryptopals.bintext import b16enc
-from cryptopals.xor import repeating_key_xor
+from cryptopals.xor import RepeatingKeyXor, repeating_key_xor, repeating_key_xor_into
 
 
 def test_challenge() -> None:
@@ -17,3 +23,51 @@ def test_challenge() -> None:
     actual = b16enc(repeating_key_xor(plaintext, key))
 
     assert expected == actual
+
+
+def _naive_xor(s: bytes, key: bytes, phase: int = 0) -> bytes:
+    keys = cycle(key[phase:] + key[:phase])
+    return bytes(c ^ k for c, k in zip(s, keys))
+
+
+@pytest.mark.parametrize("have_numpy", [False, xor.HAVE_NUMPY])
+def test_buffers(have_numpy: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(xor, "HAVE_NUMPY", have_numpy)
+    # small chunks, so that inputs span several of them
+    monkeypatch.setattr(xor, "_XOR_CHUNK_SZ", 64)
+
+    s = os.urandom(1000)
+    for key in (b"k", b"ICE", os.urandom(29), os.urandom(64), os.urandom(100)):
+        expected = _naive_xor(s, key)
+
+        assert repeating_key_xor(s, key) == expected
+        assert repeating_key_xor(memoryview(bytearray(s)), memoryview(key)) == expected
+        assert repeating_key_xor(b"", key) == b""
+
+        # in place
+        buf = bytearray(s)
+        assert repeating_key_xor_into(buf, key, buf) == len(s)
+        assert buf == expected
+
+        # into a larger buffer, starting part way through the key
+        out = bytearray(len(s) + 10)
+        assert repeating_key_xor_into(s, key, memoryview(out), phase=2) == len(s)
+        assert out == _naive_xor(s, key, 2 % len(key)) + bytes(10)
+
+        stream = RepeatingKeyXor(key)
+        pieces = [s[:7], s[7:7], s[7:300], s[300:]]
+        assert b"".join(stream.update(piece) for piece in pieces) == expected
+        assert stream.phase == len(s) % len(key)
+
+
+def test_empty_key() -> None:
+    with pytest.raises(ValueError):
+        repeating_key_xor(b"abc", b"")
+    with pytest.raises(ValueError):
+        repeating_key_xor(b"", b"")
+    with pytest.raises(ValueError):
+        repeating_key_xor_into(b"abc", b"", bytearray(3))
+    with pytest.raises(ValueError):
+        RepeatingKeyXor(b"")
+    with pytest.raises(ValueError):
+        repeating_key_xor_into(b"abc", b"k", bytearray(2))
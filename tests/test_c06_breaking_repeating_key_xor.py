@@ -1,11 +1,18 @@
-from cryptopals.bintext import b64dec
-from cryptopals.xor import find_repeating_xor_key, repeating_key_xor
-from tests.fixtures import data_file_contents
-from cryptopals.hamming import hamming_distance
+import pytest
+
+from cryptopals.xor import (
+    KEY_SZ_METHODS,
+    find_repeating_xor_key,
+    find_repeating_xor_keys,
+    rank_key_sizes,
+    repeating_key_xor,
+)
+from tests.fixtures import data_file_b64dec
+from cryptopals.hamming import hamming_distance, pairwise_hamming
 
 
 def test_challenge() -> None:
-    ct = b64dec(data_file_contents("c06_breaking_repeating_key_xor.txt"))
+    ct = data_file_b64dec("c06_breaking_repeating_key_xor.txt")
 
     key = find_repeating_xor_key(ct)
 
@@ -21,3 +28,45 @@ def test_hamming() -> None:
     expected = 37
 
     assert hamming_distance(a, b) == expected
+
+
+def test_pairwise_hamming() -> None:
+    blocks = [b"this is a test", b"wokka wokka!!!", b"this is a tesT"]
+
+    assert pairwise_hamming(blocks) == [
+        [0, 37, 1],
+        [37, 0, hamming_distance(blocks[1], blocks[2])],
+        [1, hamming_distance(blocks[2], blocks[1]), 0],
+    ]
+
+
+@pytest.mark.parametrize("method", KEY_SZ_METHODS)
+def test_rank_key_sizes(method: str) -> None:
+    ct = data_file_b64dec("c06_breaking_repeating_key_xor.txt")
+
+    best = rank_key_sizes(ct, method=method)[0]
+
+    assert best.key_sz == 29
+    assert best.confidence > 3
+
+    # short inputs only skip the key sizes that don't fit twice
+    short_results = rank_key_sizes(ct[:60], sz_low=20, method=method)
+    assert sorted(r.key_sz for r in short_results) == list(range(20, 31))
+
+    assert rank_key_sizes(ct, method=method, max_blks=2)
+    with pytest.raises(ValueError):
+        rank_key_sizes(ct, method=method, max_blks=1)
+    with pytest.raises(ValueError):
+        rank_key_sizes(ct[:3], sz_low=2, sz_hi=4, method=method)
+
+
+def test_top_keys() -> None:
+    ct = data_file_b64dec("c06_breaking_repeating_key_xor.txt")
+
+    keys = find_repeating_xor_keys(ct, 3, workers=2)
+
+    assert keys[0] == b"Terminator X: Bring the noise"
+    assert len(set(keys)) == 3
+    # the runner-up keys only differ from the best one in a single byte
+    for key in keys[1:]:
+        assert sum(a != b for a, b in zip(key, keys[0])) == 1
@@ -1,11 +1,30 @@
-from cryptopals.bintext import b64dec
-from tests.fixtures import data_file_contents
-from cryptopals.aes import ecb_decrypt
-from cryptopals.padding import pkcs7_unpad
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pickle
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from tests.fixtures import data_file_b64dec
+from cryptopals import aes
+from cryptopals.aes import (
+    BLK_SZ_BYTES,
+    AESContext,
+    ECBDecryptStream,
+    ECBEncryptStream,
+    aes_context,
+    ecb_crypt_file,
+    ecb_decrypt,
+    ecb_decrypt_into,
+    ecb_encrypt,
+    ecb_encrypt_into,
+)
+from cryptopals.padding import pkcs7_pad, pkcs7_unpad
 
 
 def test_challenge() -> None:
-    ct = b64dec(data_file_contents("c07_aes_in_ecb.txt"))
+    ct = data_file_b64dec("c07_aes_in_ecb.txt")
 
     key = b"YELLOW SUBMARINE"
 
@@ -18,3 +37,87 @@ def test_challenge() -> None:
 
     assert pt.startswith(b"I'm back and I'm ringin' the bell \n")
     assert len(pt) == 2876
+
+
+def test_aes_context() -> None:
+    key = b"YELLOW SUBMARINE"
+    pt = b"I'm back and I'm ringin' the bell" + b"\x0f" * 15
+
+    assert aes_context(key) is aes_context(key)
+    assert aes_context(bytearray(key)) is aes_context(key)
+
+    # contexts aren't thread-safe, so each thread gets its own
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(aes_context, key).result() is not aes_context(key)
+
+    aes = AESContext(key)
+    ct = aes.encrypt_blocks(pt)
+    assert ct == ecb_encrypt(pt, key)
+
+    # exactly-sized and roomier output buffers
+    for extra in (0, BLK_SZ_BYTES):
+        out = bytearray(len(pt) + extra)
+        assert aes.decrypt_blocks_into(ct, out) == len(pt)
+        assert out[: len(pt)] == pt
+
+    assert pickle.loads(pickle.dumps(aes)).encrypt_blocks(pt) == ct
+
+    with pytest.raises(ValueError):
+        aes.encrypt_blocks(pt[:-1])
+    # a rejected partial block doesn't garble later calls
+    assert aes.encrypt_blocks(pt) == ct
+
+
+def test_streams() -> None:
+    key = b"YELLOW SUBMARINE"
+    pt = b"I'm back and I'm ringin' the bell \n" * 5
+
+    encrypt = ECBEncryptStream(key)
+    ct = b"".join(encrypt.update(pt[i : i + 7]) for i in range(0, len(pt), 7))
+    ct += encrypt.finalize()
+    assert ct == ecb_encrypt(pkcs7_pad(pt, BLK_SZ_BYTES), key)
+
+    decrypt = ECBDecryptStream(key)
+    assert decrypt.update(ct[:40]) + decrypt.update(ct[40:]) + decrypt.finalize() == pt
+
+
+@pytest.mark.parametrize("workers", [1, 3, None])
+def test_parallel(
+    workers: Optional[int], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # small ranges, so that buffers span several of them
+    monkeypatch.setattr(aes, "_ECB_RANGE_SZ", 4 * BLK_SZ_BYTES)
+    key = b"YELLOW SUBMARINE"
+    pt = os.urandom(50 * BLK_SZ_BYTES)
+    expected = aes_context(key).encrypt_blocks(pt)
+
+    assert ecb_encrypt(pt, key, workers=workers) == expected
+    assert ecb_decrypt(expected, key, workers=workers) == pt
+
+    # into exactly-sized and roomier buffers
+    for extra in (0, 7):
+        out = bytearray(len(pt) + extra)
+        assert ecb_encrypt_into(pt, key, memoryview(out), workers=workers) == len(pt)
+        assert out[: len(pt)] == expected
+
+    # in place
+    buf = bytearray(expected)
+    ecb_decrypt_into(buf, key, buf, workers=workers)
+    assert buf == pt
+
+    with pytest.raises(ValueError):
+        ecb_encrypt_into(pt[:-1], key, bytearray(len(pt)), workers=workers)
+    with pytest.raises(ValueError):
+        ecb_encrypt_into(pt, key, bytearray(len(pt) - 1), workers=workers)
+
+    src, dst = tmp_path / "pt.bin", tmp_path / "ct.bin"
+    src.write_bytes(pt)
+    assert ecb_crypt_file(src, dst, key, workers=workers) == len(pt)
+    assert dst.read_bytes() == expected
+    assert ecb_crypt_file(dst, src, key, decrypt=True, workers=workers) == len(pt)
+    assert src.read_bytes() == pt
+
+    # into itself, even by another path, would truncate it before it's read
+    with pytest.raises(ValueError):
+        ecb_crypt_file(src, tmp_path / "." / "pt.bin", key, workers=workers)
+    assert src.read_bytes() == pt
@@ -1,22 +1,121 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from cryptopals import corpus
 from cryptopals.bintext import b64dec
-from tests.fixtures import data_file_lines
-from cryptopals.aes import BLK_SZ_BYTES
+from cryptopals.corpus import INDEX_SUFFIX, LineCorpus
+from cryptopals.detect import detect_ecb, detect_ecb_file, repeated_blocks
+from tests.fixtures import data_file_corpus, data_file_lines
 
 
 def test_challenge() -> None:
-    cts = [b64dec(line) for line in data_file_lines("c08_detect_aes_ecb.txt")]
+    cts = [b64dec(line) for line in data_file_corpus("c08_detect_aes_ecb.txt")]
+
+    detections = detect_ecb(cts)
+
+    assert len(detections) == 1
+    assert detections[0].idx == 132
+    assert detections[0].n_blks - detections[0].repeats == 12
+    assert detections[0].repeats == 3
+    assert all(len(blk) == 16 for blk in detections[0].positions)
+
+    assert [d.idx for d in detect_ecb(cts, workers=2, batch_sz=16)] == [132]
+
+
+def test_repeated_blocks() -> None:
+    ct = bytearray(b"AAAABBBBAAAACCCCBBBBAAAAxy")
+
+    assert repeated_blocks(ct, 4) == {b"AAAA": [0, 2, 5], b"BBBB": [1, 4]}
+    assert repeated_blocks(b"AAAABBBB", 4) == {}
+
+
+def test_ranking_and_file(tmp_path: Path) -> None:
+    records = [
+        b"0123456789abcdef" * 2,
+        b"0123456789abcdef" * 4,
+        bytes(range(64)),
+        b"fedcba9876543210" * 4,
+    ]
+    records = [r.ljust(64, b"\xff") for r in records]
+
+    detections = detect_ecb(records)
+    assert [(d.idx, d.repeats) for d in detections] == [(1, 3), (3, 3), (0, 2)]
+    assert [d.idx for d in detect_ecb(records, top_k=1)] == [1]
+    assert [d.idx for d in detect_ecb(records, min_repeats=3)] == [1, 3]
+    with pytest.raises(ValueError):
+        detect_ecb(records, top_k=0)
+
+    path = tmp_path / "cts.bin"
+    path.write_bytes(b"".join(records) + b"partial")
+
+    for workers in (1, 2):
+        from_file = detect_ecb_file(path, 64, workers=workers, batch_sz=1)
+        assert [(d.idx, d.repeats) for d in from_file] == [(1, 3), (3, 3), (0, 2)]
+        assert from_file[0].positions == detections[0].positions
+
+
+def _shard_detections(shard: LineCorpus) -> list[tuple[int, int]]:
+    return [(d.idx, d.repeats) for d in detect_ecb(b64dec(line) for line in shard)]
+
+
+@pytest.mark.parametrize("have_numpy", [False, corpus.HAVE_NUMPY])
+def test_corpus(
+    have_numpy: bool, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(corpus, "HAVE_NUMPY", have_numpy)
+
+    lines = data_file_lines("c08_detect_aes_ecb.txt")
+    path = tmp_path / "cts.txt"
+    # a crlf line break, a blank line and no trailing line break
+    path.write_text("\n".join(lines[:2]) + "\r\n\n" + "\n".join(lines[2:]))
+
+    with LineCorpus(path) as cts:
+        assert len(cts) == len(lines) + 1
+        assert bytes(cts[0]) == lines[0].encode()
+        assert bytes(cts[2]) == b""
+        assert bytes(cts[-1]) == lines[-1].encode()
+        with pytest.raises(IndexError):
+            cts[len(cts)]
+
+        shard = cts[100:140]
+        assert len(shard) == 40
+        assert bytes(shard[32]) == lines[131].encode()
+        assert [bytes(line) for line in shard[30:]] == [
+            line.encode() for line in lines[129:139]
+        ]
+
+        shards = cts.shards(3)
+        assert [len(s) for s in shards] == [68, 68, 69]
+        assert [bytes(line) for s in shards for line in s] == [
+            bytes(line) for line in cts
+        ]
+
+        # shards are mapped again by each worker process
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            found = list(executor.map(_shard_detections, shards))
+        assert found == [[], [(133 - 68, 3)], []]
 
-    smallest_uniq_blks = len(cts[0]) // BLK_SZ_BYTES
-    smallest_uniq_blks_idx = -1
+        # closing a shard leaves the map of the corpus, and of its other shards, open
+        with shards[0]:
+            pass
+        shard.close()
+        assert bytes(cts[3]) == lines[2].encode()
+        assert bytes(shards[1][0]) == lines[67].encode()
 
-    for idx, ct in enumerate(cts):
-        uniq_blks = set(
-            ct[i : i + BLK_SZ_BYTES] for i in range(0, len(ct), BLK_SZ_BYTES)
-        )
+    # the second open uses the cached index
+    assert (tmp_path / f"cts.txt{INDEX_SUFFIX}").exists()
+    monkeypatch.setattr(corpus, "_line_ends", None)
+    with LineCorpus(path) as cts:
+        assert bytes(cts[133]) == lines[132].encode()
 
-        if len(uniq_blks) < smallest_uniq_blks:
-            smallest_uniq_blks = len(uniq_blks)
-            smallest_uniq_blks_idx = idx
+    # and an index that doesn't match the file is rebuilt
+    path.write_text("a\nb")
+    monkeypatch.undo()
+    with LineCorpus(path) as cts:
+        assert [bytes(line) for line in cts] == [b"a", b"b"]
 
-    assert smallest_uniq_blks == 12
-    assert smallest_uniq_blks_idx == 132
+    (tmp_path / "empty.txt").write_bytes(b"")
+    with LineCorpus(tmp_path / "empty.txt", cache_index=False) as cts:
+        assert len(cts) == 0 and list(cts) == []
@@ -1,4 +1,11 @@
-from cryptopals.padding import pkcs7_pad, pkcs7_unpad
+import pytest
+
+from cryptopals.padding import (
+    pkcs7_pad,
+    pkcs7_pad_inplace,
+    pkcs7_unpad,
+    validate_pkcs7,
+)
 
 
 def test_challenge() -> None:
@@ -14,3 +21,48 @@ def test_challenge() -> None:
     unpadded = pkcs7_unpad(padded)
 
     assert data == unpadded
+
+
+def test_validate() -> None:
+    blk = b"YELLOW SUBMARINE"
+
+    for n in range(1, 17):
+        padded = pkcs7_pad(blk[:-n], 16)
+        assert validate_pkcs7(padded, 16) == n
+        assert validate_pkcs7(blk + padded, 16) == n
+        assert validate_pkcs7(memoryview(bytearray(padded)), 16) == n
+        assert pkcs7_unpad(padded, 16) == blk[:-n]
+
+    for bad in (
+        blk,
+        blk[:-1] + b"\x00",
+        blk[:-1] + b"\x11",
+        blk[:-1] + b"\xff",
+        blk[:-3] + b"\x03\x02\x03",
+        blk[:-2] + b"\x03\x03",
+        b"\x10" * 15 + b"\x11",
+    ):
+        assert validate_pkcs7(bad, 16) == 0
+        with pytest.raises(ValueError):
+            pkcs7_unpad(bad, 16)
+
+    # only whole blocks have valid padding
+    assert validate_pkcs7(b"", 16) == 0
+    assert validate_pkcs7(b"\x01" * 17, 16) == 0
+
+    with pytest.raises(ValueError):
+        pkcs7_unpad(b"")
+    with pytest.raises(ValueError):
+        pkcs7_pad(blk, 256)
+    with pytest.raises(ValueError):
+        validate_pkcs7(blk, 0)
+
+
+def test_pad_inplace() -> None:
+    buf = bytearray(b"YELLOW SUBMARINE")
+
+    assert pkcs7_pad_inplace(buf, 20) == 4
+    assert buf == b"YELLOW SUBMARINE\x04\x04\x04\x04"
+
+    assert pkcs7_pad_inplace(buf, 20) == 20
+    assert pkcs7_unpad(buf, 20) == b"YELLOW SUBMARINE\x04\x04\x04\x04"
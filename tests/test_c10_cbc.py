@@ -1,11 +1,30 @@
-from cryptopals.padding import pkcs7_unpad
-from tests.fixtures import data_file_contents
-from cryptopals.bintext import b64dec
-from cryptopals.aes import BLK_SZ_BYTES, cbc_decrypt
+import os
+from pathlib import Path
+from typing import Union
+
+import pytest
+
+from cryptopals.padding import pkcs7_pad, pkcs7_unpad
+from tests.fixtures import data_file_b64dec, data_file_path
+from cryptopals import aes
+from cryptopals.aes import (
+    BLK_SZ_BYTES,
+    CBCDecryptStream,
+    CBCEncryptStream,
+    cbc_decrypt,
+    cbc_encrypt,
+    cbc_encrypt_batch,
+    ecb_encrypt,
+    ecb_encrypt_batch,
+    encrypt_batch,
+    read_chunks,
+    stream_chunks,
+)
+from cryptopals.bintext import b64dec_stream
 
 
 def test_challenge() -> None:
-    ct = b64dec(data_file_contents("c10_cbc.txt"))
+    ct = data_file_b64dec("c10_cbc.txt")
     key = b"YELLOW SUBMARINE"
     iv = b"\x00" * BLK_SZ_BYTES
 
@@ -13,4 +32,119 @@ def test_challenge() -> None:
     unpadded = pkcs7_unpad(decrypted)
 
     assert unpadded.startswith(b"I'm back and I'm ringin' the bell \n")
-    assert len(unpadded) == 2876
\ No newline at end of file
+    assert len(unpadded) == 2876
+
+    # the same, without ever holding the whole ciphertext
+    with data_file_path("c10_cbc.txt").open("rb") as f:
+        streamed = stream_chunks(CBCDecryptStream(key, iv), b64dec_stream(f))
+        assert b"".join(streamed) == unpadded
+
+
+def test_round_trip() -> None:
+    key = b"YELLOW SUBMARINE"
+    iv = bytes(range(BLK_SZ_BYTES))
+    pt = pkcs7_pad(b"I'm back and I'm ringin' the bell " * 10, BLK_SZ_BYTES)
+
+    ct = cbc_encrypt(pt, key, iv)
+
+    # identical plaintext blocks don't make identical ciphertext blocks
+    blks = {ct[i : i + BLK_SZ_BYTES] for i in range(0, len(ct), BLK_SZ_BYTES)}
+    assert len(blks) == len(ct) // BLK_SZ_BYTES
+
+    assert cbc_decrypt(ct, key, iv) == pt
+
+
+@pytest.mark.parametrize("chunk_sz", [1, 5, 16, 33, 1 << 20])
+def test_streams(chunk_sz: int, tmp_path: Path) -> None:
+    key = b"YELLOW SUBMARINE"
+    iv = bytes(range(BLK_SZ_BYTES))
+
+    for pt_len in (0, 1, 15, 16, 17, 100, 160):
+        pt = os.urandom(pt_len)
+        expected = cbc_encrypt(pkcs7_pad(pt, BLK_SZ_BYTES), key, iv)
+
+        path = tmp_path / "pt.bin"
+        path.write_bytes(pt)
+        with path.open("rb") as f:
+            ct = b"".join(
+                stream_chunks(CBCEncryptStream(key, iv), read_chunks(f, chunk_sz))
+            )
+        assert ct == expected
+
+        chunks = [ct[i : i + chunk_sz] for i in range(0, len(ct), chunk_sz)]
+        assert b"".join(stream_chunks(CBCDecryptStream(key, iv), chunks)) == pt
+
+        # the decrypting stream holds back the block that may be the padding
+        stream = CBCDecryptStream(key, iv)
+        assert stream.update(ct) == cbc_decrypt(ct, key, iv)[:-BLK_SZ_BYTES]
+
+
+def test_stream_errors() -> None:
+    key = b"YELLOW SUBMARINE"
+    iv = bytes(BLK_SZ_BYTES)
+
+    encrypt = CBCEncryptStream(key, iv, pad=False)
+    encrypt.update(b"not a whole block")
+    with pytest.raises(ValueError):
+        encrypt.finalize()
+
+    stream = CBCDecryptStream(key, iv)
+    stream.update(bytes(BLK_SZ_BYTES + 1))
+    with pytest.raises(ValueError):
+        stream.finalize()
+
+    with pytest.raises(ValueError):
+        CBCDecryptStream(key, iv).finalize()
+
+    pt = bytes(2 * BLK_SZ_BYTES)
+    stream = CBCDecryptStream(key, iv, unpad=False)
+    assert stream.update(cbc_encrypt(pt, key, iv)) + stream.finalize() == pt
+
+
+@pytest.mark.parametrize("have_numpy", [False, aes.HAVE_NUMPY])
+def test_batches(have_numpy: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(aes, "HAVE_NUMPY", have_numpy)
+    key = b"YELLOW SUBMARINE"
+    messages = [os.urandom(n) for n in (0, 40, 15, 16, 100, 3, 33)]
+    ivs = [os.urandom(BLK_SZ_BYTES) for _ in messages]
+
+    batch = cbc_encrypt_batch(messages, key, ivs)
+
+    assert len(batch) == len(messages)
+    assert len(batch.buffer) == batch.offsets[-1]
+    expected = [
+        cbc_encrypt(pkcs7_pad(msg, BLK_SZ_BYTES), key, iv)
+        for msg, iv in zip(messages, ivs)
+    ]
+    assert [bytes(ct) for ct in batch] == expected
+    assert bytes(batch[-1]) == expected[-1]
+
+    unpadded = [msg[: len(msg) - len(msg) % BLK_SZ_BYTES] for msg in messages]
+    batch = cbc_encrypt_batch(unpadded, key, ivs, pad=False)
+    assert [bytes(ct) for ct in batch] == [
+        cbc_encrypt(msg, key, iv) for msg, iv in zip(unpadded, ivs)
+    ]
+    with pytest.raises(ValueError):
+        cbc_encrypt_batch(messages, key, ivs, pad=False)
+
+    ecb_batch = ecb_encrypt_batch(messages, key)
+    assert [bytes(ct) for ct in ecb_batch] == [
+        ecb_encrypt(pkcs7_pad(msg, BLK_SZ_BYTES), key) for msg in messages
+    ]
+
+    # a key of its own for every job, in either mode
+    keys = [os.urandom(16) for _ in messages]
+    jobs: list[Union[tuple[bytes, bytes], tuple[bytes, bytes, bytes]]] = [
+        (k, msg, iv) if i % 2 else (k, msg)
+        for i, (k, msg, iv) in enumerate(zip(keys, messages, ivs))
+    ]
+    assert [bytes(ct) for ct in encrypt_batch(jobs)] == [
+        (
+            cbc_encrypt(pkcs7_pad(msg, BLK_SZ_BYTES), k, iv)
+            if i % 2
+            else ecb_encrypt(pkcs7_pad(msg, BLK_SZ_BYTES), k)
+        )
+        for i, (k, msg, iv) in enumerate(zip(keys, messages, ivs))
+    ]
+
+    assert len(cbc_encrypt_batch([], key, [])) == 0
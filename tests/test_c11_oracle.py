@@ -1,3 +1,7 @@
+import pytest
+
+from cryptopals import mode_detection
+from cryptopals.mode_detection import mode_detection_trials
 from cryptopals.oracle import oracle_guess
 
 
@@ -12,3 +16,32 @@ def test_challenge() -> None:
     )
 
     assert all(oracle_guess(plaintext) for _ in range(trials))
+
+
+def test_mode_detection_trials(monkeypatch: pytest.MonkeyPatch) -> None:
+    # small tasks, so that a few trials still make several of them
+    monkeypatch.setattr(mode_detection, "_TASK_TRIALS", 50)
+
+    plaintext = b"A" * (16 - 5 + 16 * 2 + 16 - 5)
+    results = mode_detection_trials(plaintext, 200, seed=1)
+    assert results.trials == 200
+    assert results.accuracy == 1.0
+    assert min(results.confusion["ecb"]["ecb"], results.confusion["cbc"]["cbc"]) > 0
+
+    # the same seed gives the same trials, however they're spread over processes
+    parallel = mode_detection_trials(plaintext, 200, seed=1, workers=2)
+    assert parallel.confusion == results.confusion
+    assert mode_detection_trials(plaintext, 200, seed=2).confusion != (
+        results.confusion
+    )
+
+    # after a 5-10 byte prefix, a single block of A never fills a whole block, so
+    # every ECB trial is missed (and no CBC one is mistaken for ECB)
+    results = mode_detection_trials(b"A" * 16, 200, seed=1)
+    assert results.confusion["ecb"]["ecb"] == 0
+    assert results.confusion["cbc"]["ecb"] == 0
+
+    with pytest.raises(ValueError):
+        mode_detection_trials(plaintext, 0)
+    with pytest.raises(ValueError):
+        mode_detection_trials(plaintext, 200, workers=0)
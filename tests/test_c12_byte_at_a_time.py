@@ -1,14 +1,27 @@
+import asyncio
+import hashlib
+
+import pytest
+
 from cryptopals.oracle import (
+    crack_ecb_contents_async,
+    discover_blk_sz_async,
+    discover_unknown_data_length_async,
+    profile_oracle_async,
     crack_ecb_contents,
     discover_blk_sz,
     ECBRandEncryptor,
     discover_unknown_data_length,
+    crack_ecb_secret,
+    profile_oracle,
 )
 from cryptopals.bintext import b64dec
+from cryptopals.metering import MeteredEncryptor, QueryBudgetExceeded
+from cryptopals.padding import pkcs7_pad
 
 
 def test_challenge() -> None:
-    encryptor = ECBRandEncryptor.create()
+    encryptor = MeteredEncryptor(ECBRandEncryptor.create())
 
     blk_sz = discover_blk_sz(encryptor)
 
@@ -18,4 +31,148 @@ def test_challenge() -> None:
 
     unknown_data = crack_ecb_contents(encryptor, blk_sz, unknown_data_length)
 
-    assert b64dec(encryptor.unknown_data) == unknown_data
+    assert b64dec(ECBRandEncryptor.unknown_data) == unknown_data
+
+    stats = encryptor.stats()
+    # one query per byte, plus 7 each to find the block size and the length: 0, 1, 2,
+    # 4 and 8 bytes to find that the length jumps between 4 and 8, then 6 and 5.
+    assert stats.queries == len(unknown_data) + 7 + 7
+    assert sum(stats.latency_histogram.values()) == stats.queries
+
+
+def test_profile() -> None:
+    encryptor = MeteredEncryptor(ECBRandEncryptor.create())
+
+    profile = profile_oracle(encryptor)
+
+    assert profile.blk_sz == 16
+    assert profile.mode == "ecb"
+    assert profile.prefix_len == 0
+    assert profile.secret_len == len(b64dec(ECBRandEncryptor.unknown_data))
+    # 7 queries for the lengths, then 5 per fill character for the alignment
+    assert encryptor.stats().queries == 7 + 5 + 5
+
+
+def test_budget_and_rate() -> None:
+    now = 0.0
+
+    def sleep(seconds: float) -> None:
+        nonlocal now
+        now += seconds
+
+    encryptor = MeteredEncryptor(
+        ECBRandEncryptor.create(),
+        max_queries=3,
+        max_rate=2,
+        clock=lambda: now,
+        sleep=sleep,
+    )
+
+    for _ in range(3):
+        encryptor.encrypt(b"A")
+
+    with pytest.raises(QueryBudgetExceeded):
+        encryptor.encrypt(b"A")
+
+    stats = encryptor.stats()
+    assert stats.queries == 3
+    assert stats.bytes_in == 3
+    assert now == 1.0
+
+
+class ToyECBEncryptor:
+    """
+    A stand-in for ECBRandEncryptor with 8 byte blocks, where each block is "encrypted"
+    by a keyed hash of it. Counts the queries it gets.
+    """
+
+    blk_sz = 8
+    unknown_data = b"Rollin' in my 5.0\nWith my rag-top down"
+
+    def __init__(self, prefix: bytes = b"") -> None:
+        self.prefix = prefix
+        self.queries = 0
+
+    def encrypt(self, plaintext: bytes) -> bytes:
+        self.queries += 1
+        s = pkcs7_pad(self.prefix + plaintext + self.unknown_data, self.blk_sz)
+        return b"".join(
+            hashlib.blake2b(s[i : i + self.blk_sz], key=b"k", digest_size=8).digest()
+            for i in range(0, len(s), self.blk_sz)
+        )
+
+
+def test_other_blk_sz() -> None:
+    encryptor = ToyECBEncryptor()
+
+    unknown_data = crack_ecb_contents(
+        encryptor,
+        ToyECBEncryptor.blk_sz,
+        len(ToyECBEncryptor.unknown_data),
+    )
+
+    assert unknown_data == ToyECBEncryptor.unknown_data
+    # one query per byte
+    assert encryptor.queries == len(unknown_data)
+
+    assert discover_unknown_data_length(encryptor, ToyECBEncryptor.blk_sz) == len(
+        unknown_data
+    )
+    # the length jumps by a block, so the wrong block size is caught
+    with pytest.raises(ValueError):
+        discover_unknown_data_length(encryptor, 16)
+
+
+@pytest.mark.parametrize("prefix", [b"", b"A", b"xyzA", b"0123456789abcdef01234"])
+def test_prefix(prefix: bytes) -> None:
+    encryptor = ToyECBEncryptor(prefix)
+
+    profile = profile_oracle(encryptor)
+
+    assert profile.blk_sz == ToyECBEncryptor.blk_sz
+    assert profile.prefix_len == len(prefix)
+    assert profile.secret_len == len(ToyECBEncryptor.unknown_data)
+
+    assert crack_ecb_secret(encryptor, profile) == ToyECBEncryptor.unknown_data
+
+
+def test_sync_in_event_loop() -> None:
+    # the sync attacks don't start event loops of their own, so async code can call them
+    async def attack() -> bytes:
+        return crack_ecb_secret(ToyECBEncryptor(b"xyz"))
+
+    assert asyncio.run(attack()) == ToyECBEncryptor.unknown_data
+
+
+class SlowAsyncEncryptor:
+    """
+    An AsyncEncryptor that takes a while to answer, like a remote oracle would, and
+    records how many queries it had in flight at most.
+    """
+
+    def __init__(self) -> None:
+        self.encryptor = ECBRandEncryptor.create()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def encrypt(self, plaintext: bytes) -> bytes:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        return self.encryptor.encrypt(plaintext)
+
+
+def test_async() -> None:
+    encryptor = SlowAsyncEncryptor()
+
+    async def attack() -> bytes:
+        blk_sz = await discover_blk_sz_async(encryptor, concurrency=8)
+        assert blk_sz == 16
+        length = await discover_unknown_data_length_async(encryptor, blk_sz)
+        profile = await profile_oracle_async(encryptor)
+        assert (profile.blk_sz, profile.secret_len) == (blk_sz, length)
+        return await crack_ecb_contents_async(encryptor, blk_sz, length)
+
+    assert asyncio.run(attack()) == b64dec(ECBRandEncryptor.unknown_data)
+    assert 1 < encryptor.max_in_flight <= 16
@@ -0,0 +1,91 @@
+import asyncio
+
+from cryptopals.aes import BLK_SZ_BYTES
+from cryptopals.bintext import b64dec
+from cryptopals.padding_oracle import (
+    CBCPaddingOracle,
+    crack_cbc_padding_oracle,
+    crack_cbc_padding_oracle_async,
+)
+from cryptopals.score import ENGLISH_SCORER, Scorer
+
+
+def test_challenge() -> None:
+    oracle = CBCPaddingOracle.create()
+
+    for string in CBCPaddingOracle.strings:
+        iv, ct = oracle.encrypt(b64dec(string))
+
+        result = crack_cbc_padding_oracle(oracle, iv, ct)
+
+        assert result.plaintext == b64dec(string)
+        assert len(result.block_queries) == len(ct) // BLK_SZ_BYTES
+        # guessing likely bytes first does much better than the 128 queries per byte
+        # of guessing blindly
+        assert result.queries < 40 * len(ct)
+
+    iv, ct = oracle.encrypt_random_string()
+    assert crack_cbc_padding_oracle(oracle, iv, ct).plaintext in {
+        b64dec(string) for string in CBCPaddingOracle.strings
+    }
+
+    # the sync attack doesn't start an event loop, so it also works inside one
+    async def in_event_loop() -> bytes:
+        return crack_cbc_padding_oracle(oracle, iv, ct).plaintext
+
+    assert asyncio.run(in_event_loop()) in {
+        b64dec(string) for string in CBCPaddingOracle.strings
+    }
+
+
+def test_any_bytes() -> None:
+    oracle = CBCPaddingOracle.create()
+    # bytes a text prior rates as unlikely, and a plaintext ending in a full pad block
+    pt = bytes(range(256)) + b"\x02" * 14
+
+    iv, ct = oracle.encrypt(pt)
+    uniform = Scorer([1 / 256] * 256, statistic="loglik")
+
+    blind = crack_cbc_padding_oracle(oracle, iv, ct, scorer=uniform, workers=2)
+    assert blind.plaintext == pt
+
+    # english text guessed in english order takes fewer queries than in byte order
+    text = b"Now that the party is jumping, with the bass kicked in"
+    iv, ct = oracle.encrypt(text)
+    english = crack_cbc_padding_oracle(oracle, iv, ct, scorer=ENGLISH_SCORER)
+    bytewise = crack_cbc_padding_oracle(oracle, iv, ct, scorer=uniform)
+    assert english.plaintext == bytewise.plaintext == text
+    assert english.queries < bytewise.queries / 3
+
+
+class SlowPaddingOracle:
+    """
+    An AsyncPaddingOracle that takes a while to answer, like a remote oracle would, and
+    records how many queries it had in flight at most.
+    """
+
+    def __init__(self) -> None:
+        self.oracle = CBCPaddingOracle.create()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def is_valid_padding(self, iv: bytes, ct: bytes) -> bool:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.0001)
+        self.in_flight -= 1
+        return self.oracle.is_valid_padding(iv, ct)
+
+
+def test_async() -> None:
+    slow_oracle = SlowPaddingOracle()
+    pt = b64dec(CBCPaddingOracle.strings[1])
+    iv, ct = slow_oracle.oracle.encrypt(pt)
+
+    result = asyncio.run(
+        crack_cbc_padding_oracle_async(slow_oracle, iv, ct, concurrency=3)
+    )
+
+    assert result.plaintext == pt
+    # every block is cracked at the same time, up to the concurrency
+    assert slow_oracle.max_in_flight == 3
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from cryptopals import aes
+from cryptopals.aes import CTRStream, ctr_decrypt, ctr_encrypt, ctr_keystream
+from cryptopals.bintext import b64dec
+
+
+def test_challenge() -> None:
+    ct = b64dec(
+        "L77na/nrFsKvynd6HzOoG7GHTLXsTVu9qvY/2syLXzhPweyyMTJULu/6/kXX0KSvoOLSFQ=="
+    )
+    key = b"YELLOW SUBMARINE"
+
+    pt = ctr_decrypt(ct, key, 0)
+
+    assert pt == b"Yo, VIP Let's kick it Ice, Ice, baby Ice, Ice, baby "
+    assert ctr_encrypt(pt, key, 0) == ct
+
+
+def test_keystream() -> None:
+    key = b"YELLOW SUBMARINE"
+    # nonce and counter are little-endian 64-bit ints
+    counter_blk = (7).to_bytes(8, "little") + (3).to_bytes(8, "little")
+    assert ctr_keystream(key, 7, 3 * 16, 16) == aes.ecb_encrypt(counter_blk, key)
+
+    keystream = ctr_keystream(key, 7, 0, 1000)
+    for offset, sz in ((0, 0), (5, 11), (16, 16), (17, 40), (999, 1)):
+        assert ctr_keystream(key, 7, offset, sz) == keystream[offset : offset + sz]
+
+
+@pytest.mark.parametrize("offset", [0, 5, 4096])
+def test_random_access(offset: int, monkeypatch: pytest.MonkeyPatch) -> None:
+    # small chunks, so that inputs span several of them
+    monkeypatch.setattr(aes, "_CTR_CHUNK_SZ", 64)
+    key = os.urandom(16)
+    pt = os.urandom(1000)
+
+    ct = ctr_encrypt(pt, key, 42, offset=offset)
+    assert ctr_decrypt(ct, key, 42, offset=offset) == pt
+
+    # any slice decrypts on its own, given where it is
+    assert ctr_decrypt(ct[333:555], key, 42, offset=offset + 333) == pt[333:555]
+
+    stream = CTRStream(key, 42, offset)
+    pieces = [ct[:7], ct[7:7], ct[7:300], ct[300:]]
+    assert b"".join(stream.update(piece) for piece in pieces) == pt
+    assert stream.tell() == offset + len(pt)
+
+    stream.seek(offset + 600)
+    out = bytearray(100)
+    assert stream.update_into(ct[600:700], out) == 100
+    assert out == pt[600:700]
+
+    # in place
+    buf = bytearray(ct)
+    aes.ctr_encrypt_into(buf, key, 42, buf, offset)
+    assert buf == pt
+
+    assert ctr_encrypt(pt, key, 42, offset=offset, workers=3) == ct